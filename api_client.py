@@ -2,7 +2,9 @@
 API client for interacting with the sport lesson booking system.
 """
 import logging
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
 from datetime import datetime, timedelta
 import requests
 from requests.adapters import HTTPAdapter
@@ -10,17 +12,66 @@ from urllib3.util.retry import Retry
 
 from config import Config
 from auth import AuthClient
+from json_stream import iter_array
+from lesson import now_local
 
 logger = logging.getLogger(__name__)
 
 
+class ScheduleError(Exception):
+    """Raised when a schedule cannot be fetched or decoded."""
+    pass
+
+
+class RateLimiter:
+    """Thread-safe token bucket: bursts of up to `burst` calls, refilled at `rate` per second."""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> float:
+        """
+        Wait until a call is allowed.
+        
+        Returns:
+            Seconds spent waiting
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
 class APIClient:
     """Client for interacting with the booking API."""
     
-    def __init__(self):
+    def __init__(self, location_id: str = None):
         self.base_url = Config.BASE_URL
-        self.auth_client = AuthClient()
+        self.auth_client = AuthClient(location_id)
         self.session = self._create_session()
+        # Shared by every caller, so the backend sees the same load however many tasks run
+        self._slots = threading.BoundedSemaphore(max(1, Config.API_CONCURRENCY))
+        self.rate_limiter = RateLimiter(Config.API_RATE_PER_SECOND, Config.API_RATE_BURST)
+    
+    @property
+    def location_id(self) -> str:
+        """Default location for schedule requests and token validation."""
+        return self.auth_client.location_id
+    
+    @location_id.setter
+    def location_id(self, location_id: str) -> None:
+        self.auth_client.location_id = location_id
     
     def _create_session(self) -> requests.Session:
         """Create a session with retry logic."""
@@ -57,7 +108,14 @@ class APIClient:
         if 'headers' in kwargs:
             headers.update(kwargs['headers'])
         kwargs['headers'] = headers
+        kwargs.setdefault('timeout', Config.REQUEST_TIMEOUT_SECONDS)
         
+        with self._slots:
+            return self._send(method, url, kwargs)
+    
+    def _send(self, method: str, url: str, kwargs: Dict) -> requests.Response:
+        """Send a request within the concurrency and rate limits, re-authenticating once on 401."""
+        self.rate_limiter.acquire()
         try:
             response = self.session.request(method, url, **kwargs)
             response.raise_for_status()
@@ -66,56 +124,84 @@ class APIClient:
             if e.response.status_code == 401:
                 # Token might be expired, try to re-authenticate
                 logger.warning("Got 401, attempting to re-authenticate")
-                self.auth_client.token_manager.clear_token()
+                self.auth_client.invalidate()
                 headers = self.auth_client.get_auth_headers()
                 kwargs['headers'] = headers
+                self.rate_limiter.acquire()
                 response = self.session.request(method, url, **kwargs)
                 response.raise_for_status()
                 return response
             else:
                 raise
     
-    def get_schedule(self, start_date: datetime = None, end_date: datetime = None) -> List[Dict]:
+    def iter_schedule(self, start_date: datetime = None, end_date: datetime = None,
+                      location_id: str = None) -> Iterator[Dict]:
         """
-        Get the schedule of available lessons from Sportivity API.
+        Stream the schedule from the Sportivity API, one lesson at a time.
+        
+        The response body is decoded incrementally, so memory use does not
+        grow with the size of the schedule.
         
         Args:
             start_date: Start date for schedule (defaults to today)
             end_date: End date for schedule (defaults to 7 days from start)
+            location_id: Location to fetch (defaults to self.location_id)
             
-        Returns:
-            List of lesson dictionaries
+        Yields:
+            Raw lesson dictionaries
+            
+        Raises:
+            ScheduleError: If the request fails or the response is cut off or invalid
         """
         if start_date is None:
-            start_date = datetime.now()
+            start_date = now_local()
         if end_date is None:
             end_date = start_date + timedelta(days=Config.SCHEDULE_LOOKAHEAD_DAYS)
         
         # Sportivity endpoint for getting lesson IDs
         endpoint = "/SportivityAppV3/Lesson/GetIds"
         
-        # Format dates in ISO format with timezone
+        # Whole calendar days; dates are the gym's local days
         params = {
-            'LocationId': Config.LOCATION_ID,
+            'LocationId': location_id or self.location_id,
             'StartDate': start_date.strftime('%Y-%m-%dT00:00:00.000Z'),
             'EndDate': end_date.strftime('%Y-%m-%dT23:59:59.999Z')
         }
         
+        logger.info(f"Fetching schedule for location {params['LocationId']} from {start_date.date()} to {end_date.date()}")
+        count = 0
         try:
-            logger.info(f"Fetching schedule from {start_date.date()} to {end_date.date()}")
-            response = self._make_request('GET', endpoint, params=params)
-            data = response.json()
-            
-            logger.debug(f"Schedule response structure: Response={data.get('Response')}, count={len(data.get('LessonDefinitions', []))}")
-            
-            # Sportivity returns lessons in 'LessonDefinitions' array
-            lessons = data.get('LessonDefinitions', [])
-            
-            logger.info(f"Found {len(lessons)} lessons in schedule")
-            return lessons
-            
+            response = self._make_request('GET', endpoint, params=params, stream=True)
+            with response:
+                # Sportivity returns lessons in 'LessonDefinitions' array
+                for lesson_data in iter_array(response.iter_content(chunk_size=Config.STREAM_CHUNK_BYTES),
+                                              'LessonDefinitions'):
+                    count += 1
+                    yield lesson_data
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to fetch schedule: {e}")
+            raise ScheduleError(f"Failed to fetch schedule: {e}") from e
+        except ValueError as e:
+            raise ScheduleError(f"Invalid schedule response after {count} lessons: {e}") from e
+        
+        logger.info(f"Found {count} lessons in schedule")
+    
+    def get_schedule(self, start_date: datetime = None, end_date: datetime = None,
+                     location_id: str = None) -> List[Dict]:
+        """
+        Get the schedule of available lessons from Sportivity API.
+        
+        Args:
+            start_date: Start date for schedule (defaults to today)
+            end_date: End date for schedule (defaults to 7 days from start)
+            location_id: Location to fetch (defaults to self.location_id)
+            
+        Returns:
+            List of lesson dictionaries (empty on errors)
+        """
+        try:
+            return list(self.iter_schedule(start_date, end_date, location_id))
+        except ScheduleError as e:
+            logger.error(str(e))
             return []
     
     def get_lesson_by_id(self, lesson_id: str) -> Optional[Dict]:
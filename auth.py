@@ -4,13 +4,15 @@ Authentication and token management.
 import json
 import os
 import logging
-from typing import Optional, Dict
+import time
+from typing import Dict, Optional, Tuple
 from datetime import datetime
 import requests
 from cryptography.fernet import Fernet
 from pathlib import Path
 
 from config import Config
+from fileutil import atomic_write
 from user_agent import iOSUserAgent
 
 logger = logging.getLogger(__name__)
@@ -21,61 +23,111 @@ class AuthenticationError(Exception):
     pass
 
 
+# Per-process caches: the key file is read and the cipher built once, and a
+# token file is only decrypted again when it changes on disk
+_ciphers: Dict[str, Fernet] = {}
+_decrypted: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def _get_cipher(key_file: str) -> Fernet:
+    """Cipher for the key in key_file, creating the key on first use."""
+    cipher = _ciphers.get(key_file)
+    if cipher is None:
+        cipher = _ciphers[key_file] = Fernet(_get_or_create_key(key_file))
+    return cipher
+
+
+def _get_or_create_key(key_file: str) -> bytes:
+    """Get or create encryption key for token storage."""
+    key_path = Path(key_file)
+    if key_path.exists():
+        return key_path.read_bytes()
+    
+    key = Fernet.generate_key()
+    try:
+        # Create exclusively with restrictive permissions, so two processes
+        # starting at once cannot end up with different keys
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return key_path.read_bytes()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
 class TokenManager:
     """Manages bearer token storage and validation."""
     
-    def __init__(self, token_file: str = None):
+    def __init__(self, token_file: str = None, key_file: str = None):
         self.token_file = token_file or Config.TOKEN_FILE
-        self._key = self._get_or_create_key()
-        self._cipher = Fernet(self._key)
+        self._cipher = _get_cipher(key_file or Config.TOKEN_KEY_FILE)
         self._token: Optional[str] = None
+        self._rejected: Optional[str] = None  # Token the API refused, never reloaded
         self._load_token()
     
-    def _get_or_create_key(self) -> bytes:
-        """Get or create encryption key for token storage."""
-        key_file = Path('.token_key')
-        if key_file.exists():
-            return key_file.read_bytes()
-        else:
-            key = Fernet.generate_key()
-            key_file.write_bytes(key)
-            # Set restrictive permissions
-            os.chmod(key_file, 0o600)
-            return key
-    
     def _load_token(self) -> None:
-        """Load token from encrypted file."""
-        token_path = Path(self.token_file)
-        if token_path.exists():
+        """Load token from encrypted file (decrypted once per file version)."""
+        stamp = _file_stamp(self.token_file)
+        if stamp is None:
+            return
+        cached = _decrypted.get(self.token_file)
+        if cached and cached[0] == stamp:
+            token = cached[1]
+        else:
             try:
-                encrypted_data = token_path.read_bytes()
-                decrypted_data = self._cipher.decrypt(encrypted_data)
-                self._token = decrypted_data.decode('utf-8')
-                logger.info("Token loaded from storage")
+                token = self._cipher.decrypt(Path(self.token_file).read_bytes()).decode('utf-8')
             except Exception as e:
                 logger.warning(f"Failed to load token: {e}")
-                self._token = None
+                return
+            _decrypted[self.token_file] = (stamp, token)
+            logger.info("Token loaded from storage")
+        if token != self._rejected:
+            self._token = token
     
     def save_token(self, token: str) -> None:
-        """Save token to encrypted file."""
+        """Save token to encrypted file (written to a temporary file, then renamed)."""
         try:
             encrypted_data = self._cipher.encrypt(token.encode('utf-8'))
-            token_path = Path(self.token_file)
-            token_path.write_bytes(encrypted_data)
-            os.chmod(token_path, 0o600)
+            atomic_write(self.token_file, encrypted_data, mode=0o600)
+            stamp = _file_stamp(self.token_file)
+            if stamp:
+                _decrypted[self.token_file] = (stamp, token)
             self._token = token
+            self._rejected = None
             logger.info("Token saved to storage")
         except Exception as e:
             logger.error(f"Failed to save token: {e}")
             raise
     
     def get_token(self) -> Optional[str]:
-        """Get the current token."""
+        """
+        Get the current token.
+        
+        After invalidate(), a newer token saved by another process is picked
+        up from disk instead of logging in again.
+        """
+        if self._token is None:
+            self._load_token()
         return self._token
     
+    def invalidate(self) -> None:
+        """Forget a token the API rejected; the file is left for the next save to replace."""
+        if self._token is not None:
+            self._rejected = self._token
+        self._token = None
+    
     def clear_token(self) -> None:
         """Clear the token from memory and storage."""
         self._token = None
+        _decrypted.pop(self.token_file, None)
         token_path = Path(self.token_file)
         if token_path.exists():
             token_path.unlink()
@@ -85,9 +137,12 @@ class TokenManager:
 class AuthClient:
     """Handles authentication with the API."""
     
-    def __init__(self):
+    def __init__(self, location_id: str = None):
         self.base_url = Config.BASE_URL
+        # Location used to validate the token; the scheduler sets its first configured club
+        self.location_id = location_id or Config.LOCATION_ID
         self.token_manager = TokenManager()
+        self._validated_at: Optional[float] = None  # Monotonic time the token was last confirmed
         self.session = requests.Session()
         self.session.headers.update(iOSUserAgent.get_headers())
     
@@ -121,7 +176,7 @@ class AuthClient:
         
         try:
             logger.info(f"Attempting login for user: {username}")
-            response = self.session.post(login_url, json=payload)
+            response = self.session.post(login_url, json=payload, timeout=Config.REQUEST_TIMEOUT_SECONDS)
             response.raise_for_status()
             
             data = response.json()
@@ -134,6 +189,7 @@ class AuthClient:
                 raise AuthenticationError(f"No token found in response: {data}")
             
             self.token_manager.save_token(token)
+            self._validated_at = time.monotonic()
             logger.info("Login successful")
             return token
             
@@ -165,7 +221,7 @@ class AuthClient:
             today = datetime.now().strftime('%Y-%m-%dT00:00:00.000Z')
             validation_url = (
                 f"{self.base_url}/SportivityAppV3/Lesson/GetIds"
-                f"?LocationId={Config.LOCATION_ID}&StartDate={today}&EndDate={today}"
+                f"?LocationId={self.location_id}&StartDate={today}&EndDate={today}"
             )
             response = self.session.get(validation_url, headers=headers, timeout=10)
             
@@ -192,12 +248,23 @@ class AuthClient:
         """
         token = self.token_manager.get_token()
         
+        # A token confirmed recently is trusted; a 401 triggers invalidate() anyway
+        if token and self._validated_at is not None:
+            if time.monotonic() - self._validated_at < Config.TOKEN_REVALIDATE_MINUTES * 60:
+                return token
+        
         if token and self.validate_token():
+            self._validated_at = time.monotonic()
             return token
         
         logger.info("Token invalid or missing, re-authenticating...")
         return self.login()
     
+    def invalidate(self) -> None:
+        """Drop the current token after the API rejected it (401)."""
+        self.token_manager.invalidate()
+        self._validated_at = None
+    
     def get_auth_headers(self) -> Dict[str, str]:
         """
         Get headers with valid authentication token.
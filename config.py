@@ -2,7 +2,7 @@
 Configuration file for the sport lesson reservation system.
 """
 import os
-from typing import List
+from pathlib import Path
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -18,39 +18,22 @@ class Config:
     USERNAME = os.getenv('ANYTIME_USERNAME', 'wendyvanderleer@gmail.com')
     PASSWORD = os.getenv('ANYTIME_PASSWORD', 'Vanderleer82')
     
-    # Token storage
-    TOKEN_FILE = 'token.enc'
+    # Token storage (absolute paths, so the working directory does not matter)
+    TOKEN_FILE = os.getenv('TOKEN_FILE', str(Path(__file__).resolve().parent / 'token.enc'))
+    TOKEN_KEY_FILE = os.getenv('TOKEN_KEY_FILE', str(Path(__file__).resolve().parent / '.token_key'))
+    TOKEN_REVALIDATE_MINUTES = 60  # Re-check a stored token with the API at most this often
     
     # Location ID for Sportivity
     LOCATION_ID = os.getenv('LOCATION_ID', '13686')
     
-    # Lesson types to book automatically
-    # These are matched by Description field in the API response
-    LESSON_TYPES: List[str] = [
-        'BBB (billen, buik, benen)',  # Tuesday 19:00
-        'BBB (Billen, Buik, Benen)',  # Alternative capitalization
-        'Pilates',                     # Tuesday 20:00 & Wednesday 10:30
-        'Kick Fun',                    # Wednesday 09:30
-        'H.I.I.T.',                    # Friday 09:30
-        'Yoga',                        # Friday 10:30
-    ]
-    
-    # Specific lesson schedule (for filtering by day and time)
-    LESSON_SCHEDULE = {
-        1: [  # Tuesday (0=Monday, 1=Tuesday, etc.)
-            {'type': 'BBB (billen, buik, benen)', 'time': '19:00'},
-            {'type': 'BBB (Billen, Buik, Benen)', 'time': '19:00'},
-            {'type': 'Pilates', 'time': '20:00'},
-        ],
-        2: [  # Wednesday
-            {'type': 'Kick Fun', 'time': '09:30'},
-            {'type': 'Pilates', 'time': '10:30'},
-        ],
-        4: [  # Friday
-            {'type': 'H.I.I.T.', 'time': '09:30'},
-            {'type': 'Yoga', 'time': '10:30'},
-        ]
-    }
+    # Lessons to book automatically (type, weekday and start time).
+    # Edited without a restart: the running scheduler reloads the file when it changes.
+    LESSON_RULES_FILE = os.getenv('LESSON_RULES_FILE', str(Path(__file__).resolve().parent / 'lessons.json'))
+    RULES_POLL_SECONDS = 30  # How often to check the rules file for changes while idle
+    
+    # Time zone of the gym (IANA name). Lesson times are local to it and
+    # booking deadlines are computed from it, whatever the host's clock is set to.
+    TIMEZONE = os.getenv('TIMEZONE', 'Europe/Amsterdam')
     
     # Booking timing (in hours before lesson start)
     BOOKING_WINDOW_HOURS = 48
@@ -58,13 +41,17 @@ class Config:
     BOOKING_WINDOW_END_HOURS = 47  # Stop trying after 47 hours (1 hour window)
     RETRY_INTERVAL_MINUTES = 5  # Check every 5 minutes during booking window
     
-    # Retry for full lessons
-    MAX_RETRIES_FOR_FULL_LESSON = 4  # Try 4 times per day if lesson is full
-    RETRY_HOURS = [9, 12, 15, 18]  # Try at 9am, 12pm, 3pm, 6pm
+    # Retry for full lessons: only when the free capacity (MaximumParticipants - SpotsInt)
+    # seen in the schedule changes, e.g. after a cancellation
+    # Other failed attempts (timeouts, server errors) are retried on a timer: every
+    # RETRY_INTERVAL_MINUTES in the active booking window, every FAILED_RETRY_MINUTES after it
+    FAILED_RETRY_MINUTES = 60
     
     # Schedule checking
     CHECK_INTERVAL_MINUTES = 15  # How often to check for new lessons
     SCHEDULE_LOOKAHEAD_DAYS = 7  # How many days ahead to check
+    STREAM_CHUNK_BYTES = 64 * 1024  # Read size when streaming schedule responses
+    SCHEDULE_FULL_REFRESH_MINUTES = 60  # Full lookahead fetch; in between only days with upcoming deadlines
     
     # User Agent Configuration
     IOS_VERSION = '18.0'  # Darwin 24.6.0 = iOS 18.0
@@ -80,6 +67,19 @@ class Config:
     MAX_RETRY_ATTEMPTS = 3
     RETRY_DELAY_SECONDS = 5
     
+    # Outbound API load: at most API_CONCURRENCY requests in flight, and a token
+    # bucket of API_RATE_BURST requests refilled at API_RATE_PER_SECOND
+    API_CONCURRENCY = int(os.getenv('API_CONCURRENCY', '1'))
+    API_RATE_PER_SECOND = float(os.getenv('API_RATE_PER_SECOND', '1.0'))
+    API_RATE_BURST = int(os.getenv('API_RATE_BURST', '2'))
+    REQUEST_TIMEOUT_SECONDS = 30
+    CYCLE_STALL_SECONDS = 300  # A cycle running longer stops the systemd watchdog pings
+    PREFLIGHT_TIMEOUT_SECONDS = int(os.getenv('PREFLIGHT_TIMEOUT_SECONDS', '15'))  # Limit for the startup checks
+    
+    # Local status endpoint of the running service (GET /status), 0 disables it
+    STATUS_PORT = int(os.getenv('STATUS_PORT', '8787'))
+    DECISION_LOG_SIZE = int(os.getenv('DECISION_LOG_SIZE', '2048'))  # Scheduling decisions kept in memory
+    
     # Email notifications
     ENABLE_EMAIL = os.getenv('ENABLE_EMAIL', 'true').lower() in ('1', 'true', 'yes')
     EMAIL_FROM = os.getenv('EMAIL_FROM', '')
@@ -88,24 +88,28 @@ class Config:
     EMAIL_SMTP_PORT = int(os.getenv('EMAIL_SMTP_PORT', '587'))
     EMAIL_SMTP_USER = os.getenv('EMAIL_SMTP_USER', '')
     EMAIL_SMTP_PASSWORD = os.getenv('EMAIL_SMTP_PASSWORD', '')
+    OUTBOX_MAX_ATTEMPTS = 5  # Booking emails that fail this often are dropped
+    
+    # Single-instance lock held by the daemon (and by 'once') while it runs.
+    # Next to the code, so a start from another directory finds the same lock
+    LOCK_FILE = os.getenv('LOCK_FILE', str(Path(__file__).resolve().parent / 'sportivity.lock'))
+    
+    # Scheduler state and cached schedule, used for restarts and offline queries
+    STATE_FILE = os.getenv('STATE_FILE', str(Path(__file__).resolve().parent / 'scheduler_state.json'))
+    QUERY_CACHE_MAX_AGE_MINUTES = int(os.getenv('QUERY_CACHE_MAX_AGE_MINUTES', '60'))
+    
+    # Schedule history (fill-rate analytics: python main.py analytics)
+    ENABLE_ARCHIVE = os.getenv('ENABLE_ARCHIVE', 'true').lower() in ('1', 'true', 'yes')
+    ARCHIVE_FILE = os.getenv('ARCHIVE_FILE', str(Path(__file__).resolve().parent / 'schedule_archive.bin'))
+    
+    # Profiling (python main.py run --profile-cycles N, or SIGUSR1 to the service)
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_TOP_FUNCTIONS = 30  # Functions listed in the .txt summary
+    PROFILE_SIGNAL_CYCLES = int(os.getenv('PROFILE_SIGNAL_CYCLES', '1'))  # Cycles profiled per SIGUSR1
     
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = 'anytime_booking.log'
-    # Target lessons mapping (weekday: Monday=0 .. Sunday=6)
-    # Update these entries to match the lessons you want to auto-book.
-    TARGET_LESSONS = [
-        # Tuesday
-        { 'name': 'BBB', 'weekday': 1, 'start_time': '19:00' },
-        { 'name': 'Pilates', 'weekday': 1, 'start_time': '20:00' },
-        # Wednesday
-        { 'name': 'Kick Fun', 'weekday': 2, 'start_time': '09:30' },
-        { 'name': 'Pilates', 'weekday': 2, 'start_time': '10:30' },
-        # Friday
-        { 'name': 'H.I.I.T.', 'weekday': 4, 'start_time': '09:30' },
-        { 'name': 'Yoga', 'weekday': 4, 'start_time': '10:30' },
-    ]
-
     # Time matching tolerance (minutes) when comparing lesson start times
     TIME_TOLERANCE_MINUTES = 2
 
@@ -116,4 +120,6 @@ class Config:
             raise ValueError("USERNAME and PASSWORD must be set")
         if not cls.BASE_URL:
             raise ValueError("BASE_URL must be set")
+        if not Path(cls.LESSON_RULES_FILE).exists():
+            raise ValueError(f"Lesson rules file not found: {cls.LESSON_RULES_FILE}")
         return True
@@ -0,0 +1,143 @@
+"""
+In-memory audit trail of scheduling decisions.
+
+Every time the scheduler decides about a lesson (skip, target, wait for
+the window, retry, book) it records the lesson ID, the rule that decided
+and the action as small integer codes in a fixed-size ring buffer. Nothing
+is formatted until the records are read, so recording costs about as much
+as a list assignment and the trail is always on, without DEBUG logging.
+
+Read it with ``python main.py status --decisions N [--lesson ID]`` or
+``GET /decisions`` on the status endpoint.
+"""
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+# Rule that matched or failed
+RULE_BOOKING_STATUS = 1  # Lesson already has a BookingStatus in the schedule
+RULE_LOCATION = 2        # No rules for the lesson's location
+RULE_TYPE = 3            # Lesson type not wanted at the location
+RULE_SLOT = 4            # Weekday and start time (matched when the lesson is a target)
+RULE_PARSE = 5           # Lesson data could not be parsed
+RULE_WINDOW = 6          # Booking window not open yet
+RULE_CAPACITY = 7        # Full lesson retry: free capacity since the last attempt
+RULE_SERVER = 8          # Lesson details from the server (already booked, full)
+RULE_BOOKING = 9         # JoinLesson request
+
+# Action taken
+ACTION_SKIP = 1
+ACTION_TARGET = 2
+ACTION_WAIT = 3
+ACTION_RETRY = 4
+ACTION_FULL = 5
+ACTION_BOOKED = 6
+ACTION_FAILED = 7
+
+RULE_NAMES = {
+    RULE_BOOKING_STATUS: 'booking_status',
+    RULE_LOCATION: 'location',
+    RULE_TYPE: 'type',
+    RULE_SLOT: 'day_time',
+    RULE_PARSE: 'parse',
+    RULE_WINDOW: 'window',
+    RULE_CAPACITY: 'capacity',
+    RULE_SERVER: 'server',
+    RULE_BOOKING: 'booking',
+}
+
+ACTION_NAMES = {
+    ACTION_SKIP: 'skip',
+    ACTION_TARGET: 'target',
+    ACTION_WAIT: 'wait',
+    ACTION_RETRY: 'retry',
+    ACTION_FULL: 'full',
+    ACTION_BOOKED: 'booked',
+    ACTION_FAILED: 'failed',
+}
+
+Record = Tuple[float, str, int, int]
+
+
+class DecisionLog:
+    """Fixed-size ring buffer of (timestamp, lesson ID, rule, action) records."""
+
+    def __init__(self, size: int = Config.DECISION_LOG_SIZE):
+        self.size = max(1, size)
+        self.total = 0  # Records ever written; the buffer keeps the last `size`
+        self._times = array('d', bytes(8 * self.size))
+        self._ids: List[Optional[str]] = [None] * self.size
+        self._rules = bytearray(self.size)
+        self._actions = bytearray(self.size)
+        self._last: Dict[str, int] = {}  # Last decision per lesson, for record_change()
+        self._lock = threading.Lock()  # Written by the cycle thread, read by the status endpoint
+
+    def __len__(self) -> int:
+        return min(self.total, self.size)
+
+    def record(self, lesson_id: str, rule: int, action: int) -> None:
+        """Append a decision, overwriting the oldest one when the buffer is full."""
+        now = time.time()
+        with self._lock:
+            slot = self.total % self.size
+            self._times[slot] = now
+            self._ids[slot] = lesson_id
+            self._rules[slot] = rule
+            self._actions[slot] = action
+            self.total += 1
+            self._last[lesson_id] = rule << 8 | action
+
+    def record_change(self, lesson_id: str, rule: int, action: int) -> bool:
+        """
+        Append a decision only if it differs from the lesson's last one.
+
+        Used for decisions that repeat every cycle (waiting for a window or
+        a spot), so they do not push the interesting records out.
+
+        Returns:
+            True if the decision was recorded
+        """
+        if self._last.get(lesson_id) == rule << 8 | action:
+            return False
+        if len(self._last) >= 4 * self.size:
+            self._last.clear()  # Forget lessons that are long gone from the buffer
+        self.record(lesson_id, rule, action)
+        return True
+
+    def records(self, lesson_id: Optional[str] = None, limit: Optional[int] = None) -> List[Record]:
+        """
+        Recorded decisions, oldest first.
+
+        Args:
+            lesson_id: Only decisions about this lesson
+            limit: Only the newest ``limit`` decisions
+
+        Returns:
+            List of (timestamp, lesson ID, rule code, action code) tuples
+        """
+        with self._lock:
+            count = len(self)
+            start = self.total - count
+            slots = [(start + i) % self.size for i in range(count)]
+            result = [
+                (self._times[slot], self._ids[slot], self._rules[slot], self._actions[slot])
+                for slot in slots
+                if lesson_id is None or self._ids[slot] == lesson_id
+            ]
+        if limit is not None:
+            result = result[-limit:] if limit > 0 else []
+        return result
+
+
+def describe(record: Record) -> Dict:
+    """A record with readable rule and action names (JSON-serialisable)."""
+    timestamp, lesson_id, rule, action = record
+    return {
+        'time': timestamp,
+        'lesson': lesson_id,
+        'rule': RULE_NAMES.get(rule, str(rule)),
+        'action': ACTION_NAMES.get(action, str(action)),
+    }
@@ -234,3 +234,25 @@ Status: Bezig...
         except Exception as e:
             logger.error(f"Failed to send retry notification: {e}")
             return False
+    
+    @staticmethod
+    def check_connection(timeout: float = 10) -> None:
+        """
+        Connect and log in to the SMTP server without sending anything.
+        
+        Args:
+            timeout: Socket timeout in seconds
+            
+        Raises:
+            smtplib.SMTPException: If the server rejects the connection or login
+            OSError: If the server cannot be reached
+        """
+        if Config.EMAIL_SMTP_PORT == 465:
+            server = smtplib.SMTP_SSL(Config.EMAIL_SMTP_SERVER, Config.EMAIL_SMTP_PORT, timeout=timeout)
+        else:
+            server = smtplib.SMTP(Config.EMAIL_SMTP_SERVER, Config.EMAIL_SMTP_PORT, timeout=timeout)
+        with server:
+            if Config.EMAIL_SMTP_PORT != 465:
+                server.starttls()
+            if Config.EMAIL_SMTP_USER and Config.EMAIL_SMTP_PASSWORD:
+                server.login(Config.EMAIL_SMTP_USER, Config.EMAIL_SMTP_PASSWORD)
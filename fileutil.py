@@ -0,0 +1,168 @@
+"""
+Safe file handling shared by the daemon and the CLI.
+
+``atomic_write`` replaces a file in one rename, so readers (and a crash)
+never see a half-written state or token file. ``InstanceLock`` is an
+advisory lock that keeps a second daemon from running against the same
+files and account.
+"""
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class LockError(Exception):
+    """Raised when another instance holds the lock."""
+
+    def __init__(self, message: str, holder: Optional[Dict] = None):
+        super().__init__(message)
+        self.holder = holder or {}
+
+
+def atomic_write(path: str, data: bytes, mode: Optional[int] = None) -> None:
+    """
+    Write data to a temporary file next to path and rename it over path.
+
+    Args:
+        path: Destination file
+        data: File contents
+        mode: Permissions for the new file (e.g. 0o600), default per umask
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}-", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if mode is not None:
+                os.fchmod(f.fileno(), mode)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _pid_alive(pid: int) -> bool:
+    """True if a process with this PID exists on this host."""
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True  # Exists, but runs as another user
+    except (OSError, OverflowError):
+        return False
+    return True
+
+
+class InstanceLock:
+    """
+    Advisory single-instance lock on a file (flock).
+
+    The lock is released by the kernel when the process exits, so a crashed
+    daemon never leaves a stale lock behind. The holder's PID, start time
+    and command line are written into the file for error messages and
+    ``python main.py status``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> None:
+        """
+        Take the lock without waiting.
+
+        Raises:
+            LockError: If another process holds the lock
+        """
+        if fcntl is None:
+            logger.warning("File locking is not available on this platform, not guarding against a second instance")
+            return
+
+        # Open without truncating: the holder's details must survive a failed attempt
+        f = open(self.path, 'a+', encoding='utf-8')
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            holder = self._read()
+            raise LockError(f"Another instance is already running ({self._describe(holder)})", holder)
+
+        f.seek(0)
+        f.truncate()
+        json.dump({
+            'pid': os.getpid(),
+            'host': socket.gethostname(),
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'command': ' '.join(sys.argv),
+        }, f)
+        f.flush()
+        self._file = f
+
+    def release(self) -> None:
+        """Release the lock (also happens automatically on exit)."""
+        if self._file is None:
+            return
+        try:
+            self._file.seek(0)
+            self._file.truncate()
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def holder(self) -> Optional[Dict]:
+        """
+        Details of the process holding the lock.
+
+        The lock itself is not probed, so a status check can never make a
+        starting instance fail to take it. Instead the recorded PID is
+        checked; a process that died keeps no lock.
+
+        Returns:
+            Holder details, or None if the lock is free
+        """
+        if fcntl is None:
+            return None
+        holder = self._read()
+        pid = holder.get('pid')
+        if not isinstance(pid, int) or pid <= 0:
+            return None
+        if holder.get('host') == socket.gethostname() and not _pid_alive(pid):
+            return None
+        return holder
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _describe(holder: Dict) -> str:
+        if not holder.get('pid'):
+            return "holder unknown"
+        return f"PID {holder['pid']} on {holder.get('host', '?')} since {holder.get('started_at', '?')}: {holder.get('command', '')}"
+
+    def __enter__(self) -> 'InstanceLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
@@ -0,0 +1,113 @@
+"""
+Incremental decoding of large JSON responses.
+
+The schedule endpoint returns one object with a ``LessonDefinitions`` array
+that can hold thousands of lessons. ``iter_array`` decodes that array one
+element at a time from the response chunks, so only the current element and
+a small read buffer are in memory instead of the whole payload plus its
+decoded copy.
+"""
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator, Union
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Buffered cursor over a stream of text or UTF-8 byte chunks."""
+
+    def __init__(self, chunks: Iterable[Union[str, bytes]]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _more(self) -> bool:
+        """Append the next chunk, dropping text that has been consumed."""
+        for chunk in self._chunks:
+            if isinstance(chunk, bytes):
+                chunk = self._utf8.decode(chunk)
+            if chunk:
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                return True
+        self.eof = True
+        return False
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it ('' at the end)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        """Consume the next non-whitespace character, which must be one of chars."""
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else 'end of data'
+            raise ValueError(f"Expected one of {chars!r} in JSON stream, found {found}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._more():
+                    continue
+                raise
+            # A value that ends exactly at the buffer end may continue (e.g. a number)
+            if end == len(self.buf) and not self.eof and self._more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_array(chunks: Iterable[Union[str, bytes]], key: str) -> Iterator[Any]:
+    """
+    Yield the elements of the array stored under ``key`` in a top-level JSON object.
+
+    Other members of the object are decoded and discarded; reading stops once
+    the array has been consumed. A missing key or ``null`` yields nothing.
+
+    Args:
+        chunks: Response body as text or UTF-8 byte chunks
+        key: Name of the array member
+
+    Raises:
+        ValueError: If the data is not valid JSON or is cut off inside the array
+    """
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        name = reader.value()
+        if not isinstance(name, str):
+            raise ValueError(f"Expected an object key in JSON stream, found {name!r}")
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                return
+            while True:
+                # Read the delimiter first so a cut-off element is never yielded
+                item = reader.value()
+                delimiter = reader.expect(',]')
+                yield item
+                if delimiter == ']':
+                    return
+        reader.value()
+        if reader.expect(',}') == '}':
+            return
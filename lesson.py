@@ -0,0 +1,204 @@
+"""
+Lesson record and parsing of raw Sportivity lesson data.
+
+Kept free of network dependencies so offline commands can parse cached
+schedules without importing the API client.
+
+All lesson times are timezone-aware in the gym's zone (``Config.TIMEZONE``),
+so booking deadlines stay correct across DST changes and on hosts whose
+clock is not set to the gym's local time.
+"""
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo
+
+from config import Config
+
+LOCAL_TZ = ZoneInfo(Config.TIMEZONE)
+
+# Booking window offsets in seconds
+_WINDOW_OPEN = Config.BOOKING_WINDOW_HOURS * 3600
+_WINDOW_BUFFER = Config.BOOKING_BUFFER_MINUTES * 60
+_WINDOW_END = Config.BOOKING_WINDOW_END_HOURS * 3600
+
+
+@dataclass(frozen=True, slots=True)
+class Lesson:
+    """
+    Represents a lesson.
+
+    Immutable, so one instance can be shared between the schedule cache,
+    retry tracking and notifications. Only the booking deadlines the
+    scheduling loop compares are stored, as epoch seconds; the datetime and
+    string views used for display and booking are computed on access.
+
+    ``start_time`` is local time in ``LOCAL_TZ`` (a naive value is taken to
+    be local). Deadlines are offsets in real elapsed time from the UTC start,
+    so a window spanning a DST change still opens exactly 48 hours before.
+    """
+    id: str
+    name: str
+    lesson_type: str
+    start_time: datetime
+    duration_minutes: int
+    instructor: str = ""
+    location: str = ""
+    available_spots: int = 0
+    location_id: str = ""
+
+    # Derived fields, computed in __post_init__
+    weekday: int = field(init=False, repr=False, compare=False)
+    start_ts: float = field(init=False, repr=False, compare=False)
+    opens_ts: float = field(init=False, repr=False, compare=False)
+    target_ts: float = field(init=False, repr=False, compare=False)
+    window_end_ts: float = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        set_field = object.__setattr__
+        start = to_local(self.start_time)
+        set_field(self, 'start_time', start)
+
+        # Deadlines as offsets from the epoch start: aware datetime arithmetic
+        # in a ZoneInfo zone is wall-clock arithmetic and would be an hour off
+        # across a DST change
+        start_ts = start.timestamp()
+        set_field(self, 'weekday', start.weekday())
+        set_field(self, 'start_ts', start_ts)
+        # When booking opens for this lesson (48h before)
+        set_field(self, 'opens_ts', start_ts - _WINDOW_OPEN)
+        # The earliest time to attempt booking (5 min before window)
+        set_field(self, 'target_ts', start_ts - _WINDOW_OPEN + _WINDOW_BUFFER)
+        # When to stop the aggressive retries (47 hours before lesson)
+        set_field(self, 'window_end_ts', start_ts - _WINDOW_END)
+
+    @property
+    def start_hhmm(self) -> str:
+        """Local start time as HH:MM."""
+        return f"{self.start_time.hour:02d}:{self.start_time.minute:02d}"
+
+    @property
+    def start_utc(self) -> datetime:
+        """Start time in UTC."""
+        return self.start_time.astimezone(timezone.utc)
+
+    @property
+    def lesson_date_iso(self) -> str:
+        """Start time in the format JoinLesson expects: 2025-11-03T19:00:00.000Z."""
+        return self.start_utc.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+    @property
+    def booking_opens_at(self) -> datetime:
+        """When booking opens for this lesson, in local time."""
+        return datetime.fromtimestamp(self.opens_ts, LOCAL_TZ)
+
+    @property
+    def target_booking_time(self) -> datetime:
+        """The earliest time to attempt booking, in local time."""
+        return datetime.fromtimestamp(self.target_ts, LOCAL_TZ)
+
+    @property
+    def booking_window_end(self) -> datetime:
+        """When the aggressive retries stop, in local time."""
+        return datetime.fromtimestamp(self.window_end_ts, LOCAL_TZ)
+
+    def is_bookable_now(self, now: Optional[float] = None) -> bool:
+        """Check if this lesson is in the booking window (anytime from 48h before until lesson starts)."""
+        now = time.time() if now is None else now
+        return self.opens_ts <= now < self.start_ts
+
+    def is_in_active_booking_window(self, now: Optional[float] = None) -> bool:
+        """Check if we're in the aggressive booking window (first hour: 48h to 47h before lesson)."""
+        now = time.time() if now is None else now
+        # Aggressive window: from 5 min before 48h until 47h before lesson (1 hour window)
+        # This is when we check every 5 minutes to grab spots quickly
+        return self.target_ts <= now <= self.window_end_ts
+
+    def should_attempt_booking(self) -> bool:
+        """Check if we should attempt booking this lesson now."""
+        return self.is_in_active_booking_window()
+
+
+def now_local() -> datetime:
+    """Current time in the gym's time zone."""
+    return datetime.now(LOCAL_TZ)
+
+
+def to_local(value: datetime) -> datetime:
+    """
+    Convert a datetime to the gym's time zone.
+
+    Naive values are taken to be local wall-clock time already.
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=LOCAL_TZ)
+    return value.astimezone(LOCAL_TZ)
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse an API timestamp, using the fast ISO parser when possible."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        from dateutil import parser
+        return parser.parse(value)
+
+
+def parse_lesson_time(lesson_data: Dict, kind: str = 'Start') -> datetime:
+    """
+    Local start or end time of a raw lesson.
+
+    Uses the local time (LessonStartTime) so times match the user's
+    expectations (09:30, 10:30, etc.), and falls back to the UTC field
+    when the local one is missing.
+
+    Args:
+        lesson_data: Raw lesson data from API
+        kind: 'Start' or 'End'
+
+    Returns:
+        Timezone-aware datetime in LOCAL_TZ
+    """
+    local_value = lesson_data.get(f'Lesson{kind}Time')
+    if local_value:
+        return to_local(parse_datetime(local_value))
+    value = parse_datetime(lesson_data.get(f'UTC{kind}Time'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(LOCAL_TZ)
+
+
+def parse_lesson(lesson_data: Dict, location_id: str = "") -> Lesson:
+    """
+    Parse lesson data from Sportivity API response.
+
+    Args:
+        lesson_data: Raw lesson data from API
+        location_id: Location the lesson was fetched for
+
+    Returns:
+        Lesson object
+    """
+    start_time = parse_lesson_time(lesson_data, 'Start')
+    end_time = parse_lesson_time(lesson_data, 'End')
+
+    duration = int((end_time - start_time).total_seconds() / 60)
+
+    # Calculate available spots
+    max_participants = lesson_data.get('MaximumParticipants', 0)
+    spots_taken = lesson_data.get('SpotsInt', 0)
+    available_spots = max_participants - spots_taken
+
+    description = lesson_data.get('Description', '')
+    return Lesson(
+        id=str(lesson_data.get('_id')),  # Lesson ID
+        name=description,  # Lesson type/name
+        lesson_type=description,  # Same as name
+        start_time=start_time,
+        duration_minutes=duration,
+        instructor=lesson_data.get('Trainer', ''),
+        location=lesson_data.get('LocationName', ''),
+        available_spots=available_spots,
+        location_id=location_id
+    )
@@ -0,0 +1,317 @@
+"""
+Lesson rules: which lessons to book, loaded from an external JSON file.
+
+The rules file replaces the hard-coded lesson lists that used to live in
+config.py. It is validated on load and watched with cheap mtime polling, so
+the running daemon can pick up changes without a restart.
+
+Example ``lessons.json`` for a single club (``Config.LOCATION_ID``)::
+
+    {
+      "lessons": [
+        {"type": "Pilates", "day": "tuesday", "time": "20:00"},
+        {"type": "BBB (billen, buik, benen)", "aliases": ["BBB (Billen, Buik, Benen)"],
+         "day": "tuesday", "time": "19:00"}
+      ]
+    }
+
+Several clubs, each with its own lessons and schedule refresh interval::
+
+    {
+      "locations": [
+        {"id": "13686", "name": "First Class Sports", "refresh_minutes": 60,
+         "lessons": [{"type": "Pilates", "day": "tuesday", "time": "20:00"}]},
+        {"id": "13690", "name": "Other Club",
+         "lessons": [{"type": "Yoga", "day": "friday", "time": "10:30"}]}
+      ]
+    }
+"""
+import json
+import logging
+import os
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from config import Config
+from decision_log import RULE_BOOKING_STATUS, RULE_LOCATION, RULE_SLOT, RULE_TYPE
+from lesson import Lesson, parse_lesson
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+_TIME_RE = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+_RULE_KEYS = {'type', 'aliases', 'day', 'time'}
+_LOCATION_KEYS = {'id', 'name', 'refresh_minutes', 'lessons'}
+
+
+class RulesError(Exception):
+    """Raised when the lesson rules file is missing or invalid."""
+    pass
+
+
+class LocationRules:
+    """Compiled, immutable lesson matching rules for one location."""
+
+    __slots__ = ('id', 'name', 'refresh_minutes', 'entries', 'types', '_slots')
+
+    def __init__(self, location_id: str, name: str, refresh_minutes: int, entries: List[Dict]):
+        self.id = location_id
+        self.name = name
+        self.refresh_minutes = refresh_minutes
+        self.entries: Tuple[Dict, ...] = tuple(entries)
+        slots: Dict[Tuple[int, str], FrozenSet[str]] = {}
+        types = set()
+        for entry in self.entries:
+            names = {entry['type'], *entry.get('aliases', ())}
+            types.update(names)
+            key = (entry['weekday'], entry['time'])
+            slots[key] = slots.get(key, frozenset()) | names
+        self.types: FrozenSet[str] = frozenset(types)
+        self._slots = slots
+
+    def matches(self, lesson_type: str, weekday: int, start_time: str) -> bool:
+        """Check whether a lesson type is wanted on this weekday at this time (HH:MM)."""
+        names = self._slots.get((weekday, start_time))
+        return names is not None and lesson_type in names
+
+
+class LessonRules:
+    """Compiled, immutable set of lesson matching rules for all locations."""
+
+    __slots__ = ('locations', 'types')
+
+    def __init__(self, locations: List[LocationRules]):
+        self.locations: Dict[str, LocationRules] = {location.id: location for location in locations}
+        types = set()
+        for location in locations:
+            types.update(location.types)
+        self.types: FrozenSet[str] = frozenset(types)
+
+    @property
+    def entries(self) -> Tuple[Dict, ...]:
+        """All rule entries across locations."""
+        return tuple(entry for location in self.locations.values() for entry in location.entries)
+
+    @property
+    def default_location(self) -> str:
+        """ID of the first configured location."""
+        return next(iter(self.locations))
+
+    def for_location(self, location_id: Optional[str] = None) -> Optional[LocationRules]:
+        """Rules for a location (the first location when no ID is given)."""
+        if location_id is None:
+            location_id = self.default_location
+        return self.locations.get(location_id)
+
+    def matches(self, lesson_type: str, weekday: int, start_time: str,
+                location_id: Optional[str] = None) -> bool:
+        """Check whether a lesson type is wanted at a location on this weekday at this time (HH:MM)."""
+        location = self.for_location(location_id)
+        return location is not None and location.matches(lesson_type, weekday, start_time)
+
+    def match(self, lesson_data: Dict, location_id: Optional[str] = None) -> Optional[Lesson]:
+        """
+        Parse a raw lesson and check it against the rules of its location.
+
+        Lessons that already have a BookingStatus (booked or cancelled by the
+        user) never match. The type is checked before dates are parsed.
+
+        Returns:
+            Lesson object if it is a target lesson, None otherwise
+        """
+        return self.check(lesson_data, location_id)[0]
+
+    def check(self, lesson_data: Dict, location_id: Optional[str] = None) -> Tuple[Optional[Lesson], int]:
+        """
+        Like match(), but also report which rule decided.
+
+        Returns:
+            (Lesson or None, decision_log RULE_* code of the rule that failed,
+            or RULE_SLOT when the lesson matched)
+        """
+        if lesson_data.get('BookingStatus'):
+            return None, RULE_BOOKING_STATUS
+        location = self.for_location(location_id)
+        if location is None:
+            return None, RULE_LOCATION
+        if lesson_data.get('Description', '') not in location.types:
+            return None, RULE_TYPE
+        lesson = parse_lesson(lesson_data, location.id)
+        if not location.matches(lesson.lesson_type, lesson.weekday, lesson.start_hhmm):
+            return None, RULE_SLOT
+        return lesson, RULE_SLOT
+
+    def describe(self) -> List[str]:
+        """Human readable summary of the rules, one line per entry."""
+        lines = []
+        for location in self.locations.values():
+            prefix = f"[{location.name}] " if len(self.locations) > 1 else ""
+            lines.extend(
+                f"{prefix}{WEEKDAYS[entry['weekday']].capitalize()} {entry['time']} {entry['type']}"
+                for entry in location.entries
+            )
+        return lines
+
+    @classmethod
+    def from_dict(cls, data: Dict, source: str = '<rules>') -> 'LessonRules':
+        """
+        Validate raw rules data and compile it.
+
+        Raises:
+            RulesError: If the data does not match the expected structure
+        """
+        if not isinstance(data, dict):
+            raise RulesError(f"{source}: expected an object with a 'lessons' or 'locations' list")
+
+        if 'locations' in data:
+            raw_locations = data['locations']
+            if not isinstance(raw_locations, list) or not raw_locations:
+                raise RulesError(f"{source}: 'locations' must be a non-empty list")
+        elif isinstance(data.get('lessons'), list):
+            raw_locations = [{'id': Config.LOCATION_ID, 'lessons': data['lessons']}]
+        else:
+            raise RulesError(f"{source}: expected an object with a 'lessons' or 'locations' list")
+
+        locations = []
+        for index, raw in enumerate(raw_locations):
+            where = f"{source}: locations[{index}]" if 'locations' in data else source
+            location = cls._parse_location(raw, where)
+            if any(existing.id == location.id for existing in locations):
+                raise RulesError(f"{where}: duplicate location id {location.id!r}")
+            locations.append(location)
+
+        return cls(locations)
+
+    @classmethod
+    def load(cls, path: str) -> 'LessonRules':
+        """
+        Load and validate a rules file.
+
+        Raises:
+            RulesError: If the file cannot be read or is invalid
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except OSError as e:
+            raise RulesError(f"Cannot read lesson rules file {path}: {e}")
+        except json.JSONDecodeError as e:
+            raise RulesError(f"{path}: invalid JSON: {e}")
+        return cls.from_dict(data, source=path)
+
+    @classmethod
+    def _parse_location(cls, raw, where: str) -> LocationRules:
+        """Validate one location with its lessons."""
+        if not isinstance(raw, dict):
+            raise RulesError(f"{where}: expected an object")
+        unknown = set(raw) - _LOCATION_KEYS
+        if unknown:
+            raise RulesError(f"{where}: unknown keys {sorted(unknown)}")
+
+        location_id = raw.get('id')
+        if isinstance(location_id, bool) or not isinstance(location_id, (str, int)) or not str(location_id).strip():
+            raise RulesError(f"{where}: 'id' must be a location ID")
+        location_id = str(location_id).strip()
+
+        name = raw.get('name', location_id)
+        if not isinstance(name, str) or not name:
+            raise RulesError(f"{where}: 'name' must be a non-empty string")
+
+        refresh_minutes = raw.get('refresh_minutes', Config.SCHEDULE_FULL_REFRESH_MINUTES)
+        if isinstance(refresh_minutes, bool) or not isinstance(refresh_minutes, int) or refresh_minutes <= 0:
+            raise RulesError(f"{where}: 'refresh_minutes' must be a positive integer")
+
+        lessons = raw.get('lessons')
+        if not isinstance(lessons, list):
+            raise RulesError(f"{where}: expected a 'lessons' list")
+
+        entries = [cls._parse_rule(rule, f"{where}: lessons[{index}]") for index, rule in enumerate(lessons)]
+        if not entries:
+            logger.warning(f"{where}: no lessons configured, nothing will be booked at {name}")
+        return LocationRules(location_id, name, refresh_minutes, entries)
+
+    @classmethod
+    def _parse_rule(cls, rule, where: str) -> Dict:
+        """Validate one lesson rule."""
+        if not isinstance(rule, dict):
+            raise RulesError(f"{where}: expected an object")
+        unknown = set(rule) - _RULE_KEYS
+        if unknown:
+            raise RulesError(f"{where}: unknown keys {sorted(unknown)}")
+
+        lesson_type = rule.get('type')
+        if not isinstance(lesson_type, str) or not lesson_type.strip():
+            raise RulesError(f"{where}: 'type' must be a non-empty string")
+
+        aliases = rule.get('aliases', [])
+        if not isinstance(aliases, list) or not all(isinstance(a, str) and a for a in aliases):
+            raise RulesError(f"{where}: 'aliases' must be a list of strings")
+
+        return {
+            'type': lesson_type,
+            'aliases': tuple(aliases),
+            'weekday': cls._parse_day(rule.get('day'), where),
+            'time': cls._parse_time(rule.get('time'), where),
+        }
+
+    @staticmethod
+    def _parse_day(day, where: str) -> int:
+        """Accept a weekday name or number (Monday=0 .. Sunday=6)."""
+        if isinstance(day, bool):
+            raise RulesError(f"{where}: invalid 'day' {day!r}")
+        if isinstance(day, int) and 0 <= day <= 6:
+            return day
+        if isinstance(day, str) and day.strip().lower() in WEEKDAYS:
+            return WEEKDAYS.index(day.strip().lower())
+        raise RulesError(f"{where}: invalid 'day' {day!r} (use a weekday name or 0-6, Monday=0)")
+
+    @staticmethod
+    def _parse_time(value, where: str) -> str:
+        """Accept a 24h HH:MM start time."""
+        if isinstance(value, str) and _TIME_RE.match(value.strip()):
+            return value.strip()
+        raise RulesError(f"{where}: invalid 'time' {value!r} (expected HH:MM)")
+
+
+class RulesWatcher:
+    """Watches the rules file and recompiles it when its mtime changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stamp: Optional[Tuple[int, int]] = self._stat()
+        self.rules = LessonRules.load(path)
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def poll(self, force: bool = False) -> bool:
+        """
+        Check the rules file for changes and reload it if needed.
+
+        An invalid or missing file is logged and the previous rules are kept.
+
+        Args:
+            force: Reload even if the file looks unchanged
+
+        Returns:
+            True if new rules were loaded, False otherwise
+        """
+        stamp = self._stat()
+        if stamp == self._stamp and not force:
+            return False
+        self._stamp = stamp
+
+        try:
+            rules = LessonRules.load(self.path)
+        except RulesError as e:
+            logger.error(f"Keeping previous lesson rules: {e}")
+            return False
+
+        self.rules = rules
+        logger.info(f"Lesson rules reloaded from {self.path} ({len(rules.entries)} lessons)")
+        return True
@@ -1,67 +1,685 @@
 #!/usr/bin/env python3
 """
 Main entry point for the sport lesson booking automation system.
+
+Usage:
+    python main.py [run]          Run the booking scheduler continuously (default)
+    python main.py once           Run a single booking cycle and exit
+    python main.py preflight      Check login, API, SMTP and file permissions
+    python main.py next           Show the next booking window
+    python main.py query          Next windows, retries and bookings from the local cache
+    python main.py schedule       List target lessons in the upcoming schedule
+    python main.py status         Show service status without contacting the API
+    python main.py bench          Measure import and filtering performance
+    python main.py analytics      Report fill curves per lesson type from the schedule archive
+
+Heavy modules (requests, cryptography, dateutil) are only imported by the
+subcommands that need them, so quick commands such as ``status`` start fast.
 """
+import argparse
 import logging
 import sys
+import time
 from pathlib import Path
 
+if sys.version_info < (3, 10):
+    sys.exit(f"Python 3.10 or newer is required, this is {sys.version.split()[0]}")
+
 from config import Config
-from scheduler import BookingScheduler
+from fileutil import InstanceLock, LockError
+from lesson_rules import LessonRules, RulesError
+
+PID_FILE = 'sportivity.pid'
+EXIT_ALREADY_RUNNING = 75  # EX_TEMPFAIL: systemd/scripts may retry later
+EXIT_NOT_READY = 69  # EX_UNAVAILABLE: a required preflight check failed
 
 
-def setup_logging():
+def setup_logging(console_level: int = logging.INFO):
     """Configure logging for the application."""
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    
+
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(console_level)
     console_handler.setFormatter(logging.Formatter(log_format))
-    
+
     # File handler
     file_handler = logging.FileHandler(Config.LOG_FILE)
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(logging.Formatter(log_format))
-    
+
     # Root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, Config.LOG_LEVEL))
     root_logger.addHandler(console_handler)
     root_logger.addHandler(file_handler)
-    
+
     return root_logger
 
 
-def main():
-    """Main function."""
+def cmd_run(args) -> int:
+    """Run the booking scheduler continuously."""
     logger = setup_logging()
     logger.info("=" * 60)
     logger.info("Sport Lesson Booking Automation Starting")
     logger.info("=" * 60)
-    
+
+    lock = InstanceLock(Config.LOCK_FILE)
+    try:
+        lock.acquire()
+    except LockError as e:
+        logger.error(f"{e} - not starting a second instance")
+        return EXIT_ALREADY_RUNNING
+
     try:
         # Validate configuration
         Config.validate()
         logger.info("Configuration validated")
-        
+
+        from scheduler import BookingScheduler
+        from service import BookingService
+
         # Create scheduler and run
         scheduler = BookingScheduler()
-        
-        logger.info(f"Monitoring lesson types: {', '.join(Config.LESSON_TYPES)}")
+        service = BookingService(scheduler)
+
+        logger.info(f"Monitoring lessons: {'; '.join(scheduler.rules.describe())}")
         logger.info(f"Booking window: {Config.BOOKING_WINDOW_HOURS} hours before lesson")
         logger.info(f"Check interval: {Config.CHECK_INTERVAL_MINUTES} minutes")
-        
-        # Run continuously
-        scheduler.run_continuous()
-        
+        logger.info(f"Active booking window: {Config.BOOKING_BUFFER_MINUTES} min before to {Config.BOOKING_WINDOW_END_HOURS}h before lesson")
+        logger.info(f"Retry interval during window: {Config.RETRY_INTERVAL_MINUTES} minutes")
+        logger.info("Full lessons are retried when their free capacity changes")
+
+        if getattr(args, 'profile_cycles', 0):
+            service.profiler.request_cycles(args.profile_cycles)
+        for name in getattr(args, 'profile_function', None) or []:
+            try:
+                service.profiler.attach(scheduler, name, args.profile_calls, allowed=scheduler.DAEMON_METHODS)
+            except ValueError as e:
+                logger.error(str(e))
+                return 2
+
+        if not getattr(args, 'skip_preflight', False):
+            from preflight import run_preflight
+
+            report = run_preflight(scheduler)
+            service.preflight = report.as_dict()
+            _log_preflight(logger, report)
+            if not report.ready:
+                logger.error("Preflight failed - not starting (use --skip-preflight to start anyway)")
+                return EXIT_NOT_READY
+
+        # Run continuously (SIGTERM/SIGINT stop, SIGHUP reloads, SIGUSR1 profiles)
+        service.run()
+
     except KeyboardInterrupt:
         logger.info("\nShutdown requested by user")
-        sys.exit(0)
+        return 0
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
-        sys.exit(1)
+        return 1
+    finally:
+        lock.release()
+    return 0
+
+
+def _log_preflight(logger, report) -> None:
+    """Log the readiness report as one block."""
+    level = logging.INFO if report.ready else logging.ERROR
+    logger.log(level, f"Preflight {'passed' if report.ready else 'FAILED'} in {report.seconds:.1f}s:\n  "
+               + "\n  ".join(report.lines()))
+
+
+def cmd_preflight(args) -> int:
+    """Run the startup checks and print the readiness report."""
+    setup_logging(logging.WARNING)
+    Config.validate()
+
+    from preflight import run_preflight
+    from scheduler import BookingScheduler
+
+    report = run_preflight(BookingScheduler())
+    print(f"Preflight {'passed' if report.ready else 'FAILED'} in {report.seconds:.1f}s:")
+    for line in report.lines():
+        print(f"  {line}")
+    return 0 if report.ready else EXIT_NOT_READY
+
+
+def cmd_once(args) -> int:
+    """Run a single booking cycle and exit (refused while the service is running)."""
+    logger = setup_logging()
+    Config.validate()
+
+    lock = InstanceLock(Config.LOCK_FILE)
+    try:
+        lock.acquire()
+    except LockError as e:
+        logger.error(f"{e} - stop it first or let it do the booking")
+        return EXIT_ALREADY_RUNNING
+
+    from scheduler import BookingScheduler
+
+    try:
+        scheduler = BookingScheduler()
+        stats = scheduler.process_bookings()
+        scheduler.flush_outbox()
+        scheduler.save_state()
+    finally:
+        lock.release()
+    logger.info(
+        f"Booking cycle complete: "
+        f"{stats['booked']} booked, "
+        f"{stats['failed']} failed, "
+        f"{stats['checked']} checked"
+    )
+    return 0 if stats['failed'] == 0 else 1
+
+
+def _load_cached_state(max_age_minutes: int, refresh: bool = False) -> dict:
+    """
+    Load the saved scheduler state, fetching the schedule only when the cache is too old.
+
+    A live fetch is not written back, so a running daemon's state file is never touched.
+    """
+    from state_store import StateStore
+
+    state = StateStore(Config.STATE_FILE).load()
+    # State files written before 'last_fetch' existed only know the full refreshes
+    fetched_at = state.get('last_fetch') or max(state.get('last_full_refresh', {}).values(), default=0.0)
+    state['schedule_age'] = time.time() - fetched_at if fetched_at else None
+
+    # A schedule of unknown age counts as stale
+    age = state['schedule_age']
+    if not refresh and state.get('schedule') and age is not None and age <= max_age_minutes * 60:
+        return state
+
+    setup_logging(logging.WARNING)
+    Config.validate()
+    from scheduler import BookingScheduler
+
+    print("Schedule cache is missing or stale, fetching the live schedule...", file=sys.stderr)
+    scheduler = BookingScheduler()
+    scheduler._last_full_refresh = {}
+    scheduler.refresh_schedule()
+    state = scheduler.export_state()
+    state['schedule_age'] = 0.0
+    return state
+
+
+def _format_delta(seconds: float) -> str:
+    """Format a number of seconds as e.g. '1d 2h 05m'."""
+    seconds = int(seconds)
+    sign = '-' if seconds < 0 else ''
+    minutes, _ = divmod(abs(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    return f"{sign}{days}d {hours}h {minutes:02d}m" if days else f"{sign}{hours}h {minutes:02d}m"
+
+
+def _cached_lessons(state: dict, rules: LessonRules):
+    """Split the cached schedule into target lessons and lessons booked by the user."""
+    from lesson import parse_lesson
+
+    targets, booked = [], []
+    booked_ids = set(state.get('booked_lesson_ids', []))
+    for location_id, lesson_data in state.get('schedule', []):
+        try:
+            if lesson_data.get('BookingStatus') == 'Gereserveerd' or str(lesson_data.get('_id')) in booked_ids:
+                booked.append(parse_lesson(lesson_data, location_id))
+                continue
+            lesson = rules.match(lesson_data, location_id)
+        except (TypeError, ValueError):
+            continue
+        if lesson:
+            targets.append(lesson)
+    return targets, booked
+
+
+def cmd_next(args) -> int:
+    """Show when the next booking window opens (from the schedule cache)."""
+    state = _load_cached_state(args.max_age)
+    rules = LessonRules.load(Config.LESSON_RULES_FILE)
+    targets, _ = _cached_lessons(state, rules)
+
+    now = time.time()
+    attempted = set(state.get('attempted_lesson_ids', []))
+    upcoming = [l for l in targets if l.target_ts > now and l.id not in attempted]
+    if not upcoming:
+        print("No upcoming booking windows")
+        return 0
+
+    next_lesson = min(upcoming, key=lambda l: l.target_ts)
+    print(f"Next booking window: {next_lesson.target_booking_time.strftime('%A %Y-%m-%d %H:%M')}")
+    print(f"Opens in: {_format_delta(next_lesson.target_ts - now)}")
+    print(f"Lesson: {next_lesson.name} on {next_lesson.start_time.strftime('%A %Y-%m-%d %H:%M')}")
+    return 0
+
+
+def cmd_query(args) -> int:
+    """Answer schedule questions from the persisted cache and state."""
+    from lesson_rules import WEEKDAYS
+
+    state = _load_cached_state(args.max_age, args.refresh)
+    rules = LessonRules.load(Config.LESSON_RULES_FILE)
+    targets, booked = _cached_lessons(state, rules)
+
+    def wanted(lesson) -> bool:
+        if args.day and WEEKDAYS[lesson.weekday] != args.day.lower():
+            return False
+        if args.type and args.type.lower() not in lesson.lesson_type.lower():
+            return False
+        if args.full and lesson.available_spots > 0:
+            return False
+        return True
+
+    def line(lesson) -> str:
+        spots = 'FULL' if lesson.available_spots <= 0 else f"{lesson.available_spots} spots"
+        return (f"  {lesson.start_time.strftime('%a %d-%m %H:%M')}  {lesson.name:<28} {spots:>9}  "
+                f"window {lesson.target_booking_time.strftime('%a %H:%M')}")
+
+    now = time.time()
+    age = state.get('schedule_age')
+    print(f"Schedule: {len(state.get('schedule', []))} lessons, "
+          f"{'fetched ' + _format_delta(age) + ' ago' if age is not None else 'fetch time unknown'}")
+
+    attempted = set(state.get('attempted_lesson_ids', []))
+    retries = state.get('full_lesson_retries', {})
+    targets = sorted((l for l in targets if l.start_ts > now and wanted(l)), key=lambda l: l.start_ts)
+
+    upcoming = [l for l in targets if l.target_ts > now and l.id not in attempted]
+    print(f"\nNext booking windows ({len(upcoming)}):")
+    for lesson in upcoming:
+        print(f"{line(lesson)}  (in {_format_delta(lesson.target_ts - now)})")
+
+    waiting = [l for l in targets if l.id in retries]
+    print(f"\nWaiting for a spot or a retry ({len(waiting)}):")
+    for lesson in waiting:
+        retry_info = retries[lesson.id]
+        reason = '' if retry_info.get('full', True) else ', retrying after an error'
+        print(f"{line(lesson)}  ({retry_info['attempts']} attempts{reason})")
+
+    booked = sorted((l for l in booked if l.start_ts > now and wanted(l)), key=lambda l: l.start_ts)
+    print(f"\nBooked ({len(booked)}):")
+    for lesson in booked:
+        print(line(lesson))
+    return 0
+
+
+class _count:
+    """Iterator wrapper that counts the items passed through."""
+
+    def __init__(self, items):
+        self._items = iter(items)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self._items)
+        self.count += 1
+        return item
+
+
+def cmd_schedule(args) -> int:
+    """List target lessons (or all lessons) in the upcoming schedule."""
+    setup_logging(logging.WARNING)
+    Config.validate()
+
+    from datetime import timedelta
+    from lesson import now_local
+    from scheduler import BookingScheduler
+
+    scheduler = BookingScheduler()
+    start_date = now_local()
+    end_date = start_date + timedelta(days=args.days)
+
+    from api_client import ScheduleError
+
+    total = 0
+    target_lessons = []
+    for location in scheduler.rules.locations.values():
+        schedule_data = scheduler.api_client.iter_schedule(
+            start_date=start_date, end_date=end_date, location_id=location.id
+        )
+        try:
+            if args.all:
+                print(f"{location.name}:")
+                for lesson_data in schedule_data:
+                    total += 1
+                    print(
+                        f"{lesson_data.get('LessonStartTime', '?'):<20} "
+                        f"{lesson_data.get('Description', ''):<30} "
+                        f"{lesson_data.get('SpotsInt', 0)}/{lesson_data.get('MaximumParticipants', 0)} "
+                        f"{lesson_data.get('BookingStatus') or ''}"
+                    )
+            else:
+                counted = _count(schedule_data)
+                target_lessons.extend(scheduler.filter_target_lessons(counted, location.id))
+                total += counted.count
+        except ScheduleError as e:
+            print(f"{location.name}: {e}", file=sys.stderr)
+
+    if args.all:
+        print(f"\n{total} lessons")
+        return 0
+
+    multiple = len(scheduler.rules.locations) > 1
+    for lesson in sorted(target_lessons, key=lambda l: l.start_time):
+        print(
+            f"{lesson.start_time.strftime('%a %Y-%m-%d %H:%M')}  "
+            f"{lesson.name:<30} "
+            f"spots: {lesson.available_spots:<3} "
+            f"opens: {lesson.booking_opens_at.strftime('%a %H:%M')}"
+            f"{'  @ ' + scheduler.rules.locations[lesson.location_id].name if multiple else ''}"
+        )
+    print(f"\n{len(target_lessons)} target lessons out of {total}")
+    return 0
+
+
+def _read_pid() -> int:
+    """Return the PID from the PID file if that process is alive, else 0."""
+    import os
+
+    pid_path = Path(PID_FILE)
+    if not pid_path.exists():
+        return 0
+    try:
+        pid = int(pid_path.read_text().strip())
+        os.kill(pid, 0)
+        return pid
+    except (ValueError, OSError):
+        return 0
+
+
+def _live_status(path: str = '/status'):
+    """Status (or another resource) of the running service from its local status endpoint, or None."""
+    if not Config.STATUS_PORT:
+        return None
+    import json
+    from urllib.error import URLError
+    from urllib.request import urlopen
+
+    try:
+        with urlopen(f"http://127.0.0.1:{Config.STATUS_PORT}{path}", timeout=2) as response:
+            return json.load(response)
+    except (URLError, OSError, ValueError):
+        return None
+
+
+def cmd_status(args) -> int:
+    """Show service status from local files and the service's status endpoint (no API calls)."""
+    holder = InstanceLock(Config.LOCK_FILE).holder()
+    pid = holder.get('pid') if holder else _read_pid()
+    if holder:
+        print(f"Service:  RUNNING (PID {holder.get('pid', '?')}, since {holder.get('started_at', '?')}: "
+              f"{holder.get('command', '')})")
+    else:
+        print(f"Service:  {'RUNNING (PID ' + str(pid) + ')' if pid else 'NOT running'}")
+    print(f"Mode:     {'DRY-RUN (test mode)' if Config.DRY_RUN else 'LIVE BOOKINGS'}")
+    print(f"Email:    {'enabled' if Config.ENABLE_EMAIL else 'disabled'}")
+    print(f"Token:    {'stored' if Path(Config.TOKEN_FILE).exists() else 'missing'}")
+    try:
+        rules = LessonRules.load(Config.LESSON_RULES_FILE)
+        print("Lessons:")
+        for line in rules.describe():
+            print(f"  {line}")
+    except RulesError as e:
+        print(f"Lessons:  INVALID ({e})")
+
+    live = _live_status() if pid else None
+    if live:
+        last_cycle = live.get('last_cycle') or {}
+        print("\nLive status:")
+        print(f"  Up since:     {live['started_at']}")
+        if last_cycle:
+            print(f"  Last cycle:   {last_cycle['booked']} booked, {last_cycle['failed']} failed, "
+                  f"{last_cycle['checked']} checked ({last_cycle['duration']}s)")
+        if live.get('next_cycle_in_seconds') is not None:
+            print(f"  Next cycle:   in {_format_delta(live['next_cycle_in_seconds'])}")
+        elif live.get('cycle_running'):
+            print("  Next cycle:   running now")
+        if live.get('next_window'):
+            window = live['next_window']
+            print(f"  Next window:  {window['opens_at']} for {window['lesson']} ({window['start']})")
+        print(f"  Tracking:     {live['targets']} targets, {live['waiting_for_spot']} waiting for a spot, "
+              f"{live.get('retrying_after_error', 0)} retrying after an error, {live['outbox']} unsent emails")
+        preflight = live.get('preflight')
+        if preflight:
+            checks = ', '.join(f"{name} {'ok' if check['ok'] else 'FAILED'}"
+                               for name, check in preflight['checks'].items())
+            print(f"  Preflight:    {checks} ({preflight['seconds']}s)")
+
+    if live and (args.decisions > 0 or args.lesson):
+        from urllib.parse import urlencode
+        query = {'limit': args.decisions} if args.decisions > 0 else {}
+        if args.lesson:
+            query['lesson'] = args.lesson
+        result = _live_status('/decisions?' + urlencode(query)) or {}
+        decisions = result.get('decisions', [])
+        label = f" for lesson {args.lesson}" if args.lesson else ""
+        print(f"\nLast {len(decisions)} decisions{label} ({result.get('total', 0)} recorded since start):")
+        for decision in decisions:
+            print(f"  {decision['time'][5:19].replace('T', ' ')}  {decision['lesson']:>10}  {(decision['name'] or '?')[:28]:<28} "
+                  f"{decision['rule']:<14} {decision['action']}")
+
+    log_path = Path(Config.LOG_FILE)
+    if log_path.exists() and args.lines > 0:
+        print(f"\nLast {args.lines} log entries:")
+        with log_path.open('rb') as f:
+            # Only read the tail of the log; it can grow large
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() - 64 * 1024))
+            lines = f.read().decode('utf-8', errors='replace').splitlines()
+        for line in lines[-args.lines:]:
+            print(f"  {line}")
+    return 0
+
+
+def _synthetic_schedule(count: int) -> list:
+    """Build a synthetic LessonDefinitions list for benchmarking."""
+    from datetime import timedelta
+    from lesson import now_local
+
+    rules = LessonRules.load(Config.LESSON_RULES_FILE)
+    descriptions = sorted(rules.types) + ['Spinning', 'XCORE', 'Zumba', 'Bodypump']
+    times = ['09:30', '10:30', '19:00', '20:00', '18:00']
+    base = now_local().replace(hour=0, minute=0, second=0, microsecond=0)
+    schedule = []
+    for i in range(count):
+        # Vary description, time and day independently so every combination occurs
+        hour, minute = times[(i // len(descriptions)) % len(times)].split(':')
+        day = (i // (len(descriptions) * len(times))) % 7
+        start = (base + timedelta(days=day)).replace(hour=int(hour), minute=int(minute))
+        end = start + timedelta(hours=1)
+        schedule.append({
+            '_id': str(16000000 + i),
+            'Description': descriptions[i % len(descriptions)],
+            'LessonStartTime': start.strftime('%Y-%m-%dT%H:%M:%S'),
+            'LessonEndTime': end.strftime('%Y-%m-%dT%H:%M:%S'),
+            'Trainer': 'Bench',
+            'LocationName': 'Bench',
+            'MaximumParticipants': 20,
+            'SpotsInt': i % 21,
+            'BookingStatus': None,
+        })
+    return schedule
+
+
+def cmd_bench(args) -> int:
+    """Measure import cost of heavy modules and lesson filtering throughput."""
+    import importlib
+
+    print("Import times:")
+    for module in ('dotenv', 'dateutil.parser', 'cryptography.fernet', 'requests', 'scheduler'):
+        start = time.perf_counter()
+        importlib.import_module(module)
+        print(f"  {module:<22} {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    from scheduler import BookingScheduler
+
+    scheduler = BookingScheduler()
+    schedule_data = _synthetic_schedule(args.lessons)
+
+    timings = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        targets = scheduler.filter_target_lessons(schedule_data)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"\nfilter_target_lessons ({args.lessons} lessons, {len(targets)} targets):")
+    print(f"  best {best * 1000:.2f} ms, mean {sum(timings) / len(timings) * 1000:.2f} ms "
+          f"over {args.iterations} runs ({args.lessons / best:,.0f} lessons/s)")
+
+    # Incremental ingest: a few lessons change between fetches
+    scheduler.refresh_targets(schedule_data)
+    changes = max(1, args.lessons // 100)
+    timings = []
+    for i in range(args.iterations):
+        snapshot = [dict(lesson_data) for lesson_data in schedule_data]
+        for lesson_data in snapshot[:changes]:
+            lesson_data['SpotsInt'] = (lesson_data['SpotsInt'] + i + 1) % 21
+        start = time.perf_counter()
+        scheduler.refresh_targets(snapshot)
+        timings.append(time.perf_counter() - start)
+
+    print(f"\nrefresh_targets ({args.lessons} lessons, {changes} changed per fetch):")
+    print(f"  best {min(timings) * 1000:.2f} ms, mean {sum(timings) / len(timings) * 1000:.2f} ms "
+          f"over {args.iterations} runs")
+
+    # Decoding a response: whole body vs streamed with the fetch prefilter
+    import json
+    import tracemalloc
+    from json_stream import iter_array
+    from schedule_index import compact_lesson
+
+    body = json.dumps({'Response': 'OK', 'LessonDefinitions': schedule_data}).encode('utf-8')
+    chunk = Config.STREAM_CHUNK_BYTES
+
+    def whole():
+        return scheduler.filter_target_lessons(json.loads(body)['LessonDefinitions'])
+
+    def streamed():
+        chunks = (body[i:i + chunk] for i in range(0, len(body), chunk))
+        kept = [compact_lesson(l) for l in iter_array(chunks, 'LessonDefinitions') if scheduler._prefilter(l)]
+        return scheduler.filter_target_lessons(kept)
+
+    print(f"\nDecode + filter a {len(body) / 1024:.0f} KiB response:")
+    for label, decode in (('json.loads', whole), ('streamed', streamed)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        decode()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {label:<10} {elapsed * 1000:8.2f} ms, peak {peak / 1024:8.0f} KiB")
+    return 0
+
+
+def cmd_analytics(args) -> int:
+    """Report how quickly lessons fill up, per lesson type, from the schedule archive."""
+    from snapshot_archive import SnapshotArchive, fill_report
+
+    if not Path(Config.ARCHIVE_FILE).exists():
+        print(f"No schedule archive found at {Config.ARCHIVE_FILE}")
+        return 1
+
+    lesson_types = set(args.type) if args.type else None
+    if lesson_types is None and not args.all:
+        lesson_types = set(LessonRules.load(Config.LESSON_RULES_FILE).types)
+
+    report = fill_report(SnapshotArchive(Config.ARCHIVE_FILE), lesson_types)
+    if not report:
+        print("No matching lessons in the archive")
+        return 0
+
+    for lesson_type, stats in sorted(report.items()):
+        print(f"\n{lesson_type}: {stats['lessons']} lessons, {stats['filled']} filled up")
+        print(f"  {'hours before':>12}  {'avg fill':>8}  {'full':>6}  {'samples':>7}")
+        for bucket, (fill, full, samples) in stats['curve'].items():
+            print(f"  {'>= ' + str(bucket):>12}  {fill:>8.0%}  {full:>6.0%}  {samples:>7}")
+
+        full_hours = stats['first_full_hours']
+        if full_hours:
+            median = full_hours[len(full_hours) // 2]
+            print(f"  Typically full {median:.1f}h before start "
+                  f"(earliest {full_hours[-1]:.1f}h, latest {full_hours[0]:.1f}h)")
+        else:
+            print("  Never seen full: retries for this lesson can poll less often")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(description="Sportivity lesson booking automation")
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='run the booking scheduler continuously (default)')
+    run_parser.add_argument('--profile-cycles', type=int, default=0, metavar='N',
+                            help=f'cProfile the first N cycles into {Config.PROFILE_DIR}/')
+    run_parser.add_argument('--profile-function', action='append', metavar='NAME',
+                            help='cProfile calls to a scheduler method the daemon runs, e.g. get_upcoming_bookable_lessons '
+                                 'or evaluate_lesson (repeatable)')
+    run_parser.add_argument('--profile-calls', type=int, default=1, metavar='N',
+                            help='number of calls to profile per --profile-function (default: 1)')
+    run_parser.add_argument('--skip-preflight', action='store_true',
+                            help='start without checking login, API, SMTP and file permissions first')
+    run_parser.set_defaults(func=cmd_run)
+
+    once_parser = subparsers.add_parser('once', help='run a single booking cycle and exit')
+    once_parser.set_defaults(func=cmd_once)
+
+    preflight_parser = subparsers.add_parser('preflight', help='check login, API, SMTP and file permissions')
+    preflight_parser.set_defaults(func=cmd_preflight)
+
+    next_parser = subparsers.add_parser('next', help='show the next booking window (from cache)')
+    next_parser.add_argument('--max-age', type=int, default=Config.QUERY_CACHE_MAX_AGE_MINUTES,
+                             help='fetch the schedule if the cache is older than this many minutes')
+    next_parser.set_defaults(func=cmd_next)
+
+    query_parser = subparsers.add_parser('query', help='windows, retries and bookings from the local cache')
+    query_parser.add_argument('--day', help='only lessons on this weekday (e.g. tuesday)')
+    query_parser.add_argument('--type', help='only lessons whose type contains this text')
+    query_parser.add_argument('--full', action='store_true', help='only full lessons')
+    query_parser.add_argument('--max-age', type=int, default=Config.QUERY_CACHE_MAX_AGE_MINUTES,
+                              help='fetch the schedule if the cache is older than this many minutes')
+    query_parser.add_argument('--refresh', action='store_true', help='always fetch the live schedule')
+    query_parser.set_defaults(func=cmd_query)
+
+    schedule_parser = subparsers.add_parser('schedule', help='list target lessons in the upcoming schedule')
+    schedule_parser.add_argument('--days', type=int, default=Config.SCHEDULE_LOOKAHEAD_DAYS,
+                                 help='number of days to look ahead')
+    schedule_parser.add_argument('--all', action='store_true', help='list all lessons, not only targets')
+    schedule_parser.set_defaults(func=cmd_schedule)
+
+    status_parser = subparsers.add_parser('status', help='show service status (no API calls)')
+    status_parser.add_argument('--lines', type=int, default=5, help='number of log lines to show')
+    status_parser.add_argument('--decisions', type=int, default=10,
+                               help='number of recent scheduling decisions to show (0 hides them)')
+    status_parser.add_argument('--lesson', help='only show decisions about this lesson ID')
+    status_parser.set_defaults(func=cmd_status)
+
+    bench_parser = subparsers.add_parser('bench', help='measure import and filtering performance')
+    bench_parser.add_argument('--lessons', type=int, default=500, help='synthetic schedule size')
+    bench_parser.add_argument('--iterations', type=int, default=20, help='number of filter runs')
+    bench_parser.set_defaults(func=cmd_bench)
+
+    analytics_parser = subparsers.add_parser('analytics', help='report fill curves from the schedule archive')
+    analytics_parser.add_argument('--type', action='append', help='lesson type to report (repeatable)')
+    analytics_parser.add_argument('--all', action='store_true', help='report all lesson types, not only targets')
+    analytics_parser.set_defaults(func=cmd_analytics)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """Main function."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    func = getattr(args, 'func', cmd_run)
+    return func(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
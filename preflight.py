@@ -0,0 +1,168 @@
+"""
+Startup preflight: check everything a booking cycle needs before the first one.
+
+The token (through the token cache), backend reachability, the SMTP login
+and the writable state paths are checked in parallel, each with a strict
+time limit, so problems show up together in one readiness report at
+startup instead of one by one inside a booking window. The auth check also
+leaves a validated token in the token cache, so the first cycle does not
+have to log in.
+"""
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Tuple
+
+from config import Config
+
+
+@dataclass
+class CheckResult:
+    """Outcome of one preflight check."""
+    name: str
+    ok: bool
+    seconds: float
+    detail: str = ""
+    required: bool = True
+
+
+@dataclass
+class PreflightReport:
+    """Results of all preflight checks."""
+    results: List[CheckResult]
+    checked_at: float
+    seconds: float
+
+    @property
+    def ready(self) -> bool:
+        """True if every required check passed."""
+        return all(result.ok for result in self.results if result.required)
+
+    def lines(self) -> List[str]:
+        """Readiness report, one line per check."""
+        lines = []
+        for result in self.results:
+            if result.ok:
+                state = 'OK'
+            else:
+                state = 'FAIL' if result.required else 'WARN'
+            lines.append(f"{result.name:<8} {state:<5} {result.seconds * 1000:6.0f} ms  {result.detail}")
+        return lines
+
+    def as_dict(self) -> Dict:
+        """JSON-serialisable form for the status endpoint."""
+        return {
+            'ready': self.ready,
+            'checked_at': self.checked_at,
+            'seconds': round(self.seconds, 3),
+            'checks': {
+                result.name: dict(asdict(result), seconds=round(result.seconds, 3))
+                for result in self.results
+            },
+        }
+
+
+def check_auth(scheduler) -> str:
+    """Make sure there is a valid token, logging in if needed."""
+    auth_client = scheduler.api_client.auth_client
+    stored = auth_client.token_manager.get_token()
+    token = auth_client.ensure_authenticated()
+    return "stored token valid" if token == stored else "logged in"
+
+
+def check_api(scheduler) -> str:
+    """Connect to the backend; any HTTP answer means it is reachable."""
+    import requests
+
+    # One attempt, not the API client's retrying session, so the real error is reported
+    base_url = scheduler.api_client.base_url
+    response = requests.head(base_url, timeout=Config.PREFLIGHT_TIMEOUT_SECONDS, allow_redirects=False)
+    response.close()
+    return f"{base_url} answered {response.status_code}"
+
+
+def check_smtp(scheduler) -> str:
+    """Log in to the SMTP server without sending anything."""
+    scheduler.email_notifier.check_connection(timeout=Config.PREFLIGHT_TIMEOUT_SECONDS)
+    return f"logged in to {Config.EMAIL_SMTP_SERVER}:{Config.EMAIL_SMTP_PORT}"
+
+
+def check_paths(scheduler=None) -> str:
+    """Check that the directories of the state, token, log and archive files are writable."""
+    paths = [Config.STATE_FILE, Config.TOKEN_FILE, Config.LOG_FILE, Config.LOCK_FILE]
+    if Config.ENABLE_ARCHIVE:
+        paths.append(Config.ARCHIVE_FILE)
+    directories = sorted({os.path.dirname(os.path.abspath(path)) for path in paths})
+    for directory in directories:
+        # os.access() is not reliable (ACLs, read-only mounts): try to create a file
+        fd, tmp_path = tempfile.mkstemp(prefix='.preflight-', dir=directory)
+        os.close(fd)
+        os.unlink(tmp_path)
+    return f"{len(directories)} director{'y' if len(directories) == 1 else 'ies'} writable"
+
+
+def default_checks() -> List[Tuple[str, Callable, bool]]:
+    """The (name, check, required) checks for this configuration."""
+    checks = [
+        ('auth', check_auth, True),
+        ('api', check_api, True),
+        ('paths', check_paths, True),
+    ]
+    if Config.ENABLE_EMAIL:
+        # Booking works without email, so a mail problem is reported but does not block startup
+        checks.append(('smtp', check_smtp, False))
+    return checks
+
+
+def run_preflight(scheduler, checks: List[Tuple[str, Callable, bool]] = None,
+                  timeout: float = None) -> PreflightReport:
+    """
+    Run the checks in parallel and collect the results.
+
+    A check that does not finish within ``timeout`` seconds fails; it is not
+    waited for.
+
+    Args:
+        scheduler: BookingScheduler whose clients are checked (and warmed up)
+        checks: (name, check, required) tuples, defaults to default_checks()
+        timeout: Time limit for all checks, defaults to Config.PREFLIGHT_TIMEOUT_SECONDS
+
+    Returns:
+        PreflightReport with one result per check, in the given order
+    """
+    checks = default_checks() if checks is None else checks
+    timeout = Config.PREFLIGHT_TIMEOUT_SECONDS if timeout is None else timeout
+    started = time.monotonic()
+    finished: Dict[str, CheckResult] = {}
+
+    def timed(name: str, check: Callable, required: bool) -> None:
+        try:
+            detail = check(scheduler) or ""
+            ok = True
+        except Exception as e:
+            detail = f"{type(e).__name__}: {e}"
+            ok = False
+        finished[name] = CheckResult(name, ok, time.monotonic() - started, detail, required)
+
+    # Daemon threads: a check that is stuck (e.g. a login without a socket
+    # timeout) is not waited for, not even when the process exits
+    threads = [
+        threading.Thread(target=timed, args=check, name=f"preflight-{check[0]}", daemon=True)
+        for check in checks
+    ]
+    for thread in threads:
+        thread.start()
+    deadline = started + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    results = []
+    for name, _, required in checks:
+        result = finished.get(name)
+        if result is None:
+            result = CheckResult(name, False, timeout, f"timed out after {timeout:g}s", required)
+        results.append(result)
+
+    return PreflightReport(results, time.time(), time.monotonic() - started)
@@ -0,0 +1,137 @@
+"""
+On-demand cProfile profiling of the running scheduler.
+
+Profiling is switched on at runtime, either with ``python main.py run
+--profile-cycles N`` / ``--profile-function NAME`` or by sending SIGUSR1 to
+the running service. Each profiled cycle or call is written to a timestamped
+``.prof`` file (open with ``python -m pstats`` or snakeviz) plus a ``.txt``
+summary of the most expensive functions.
+
+When nothing is armed the scheduler pays one integer check per cycle, and
+profiled functions are only wrapped while calls remain to be profiled.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Profiles the next N scheduler cycles or calls to a chosen method."""
+
+    def __init__(self, output_dir: str = Config.PROFILE_DIR):
+        self.output_dir = output_dir
+        self.cycles_remaining = 0
+        self._thread: Optional[int] = None  # Thread being profiled; cProfile only sees that thread
+        self._lock = threading.Lock()  # Only one profile at a time, cycles run in worker threads
+        self._sequence = 0
+
+    def request_cycles(self, count: int = 1) -> None:
+        """Profile the next ``count`` cycles; safe to call from a signal handler."""
+        self.cycles_remaining += count
+
+    @contextmanager
+    def cycle(self, label: str = 'cycle') -> Iterator[None]:
+        """Profile the enclosed block if a cycle has been requested."""
+        if self.cycles_remaining <= 0 or self._thread is not None:
+            yield
+            return
+        self.cycles_remaining -= 1
+        with self._profile(label):
+            yield
+
+    def attach(self, target, name: str, calls: int = 1, allowed: Optional[Iterable[str]] = None) -> None:
+        """
+        Profile the next ``calls`` calls to a method of ``target``.
+
+        The method is wrapped on the instance and the wrapper removes itself
+        once enough calls have been profiled.
+
+        Args:
+            target: Object whose method is profiled
+            name: Method name
+            calls: Number of calls to profile
+            allowed: Methods that are actually called, e.g. by the running
+                daemon; other names are refused because they would never be profiled
+
+        Raises:
+            ValueError: If target has no such method, or it is not in ``allowed``
+        """
+        original = getattr(target, name, None)
+        if not callable(original) or name.startswith('_'):
+            raise ValueError(f"Cannot profile {name!r}: not a public method of {type(target).__name__}")
+        if allowed is not None and name not in allowed:
+            raise ValueError(f"Cannot profile {name!r}: it is never called while running, "
+                             f"choose one of {', '.join(sorted(allowed))}")
+
+        remaining = calls
+
+        def count() -> None:
+            nonlocal remaining
+            remaining -= 1
+            if remaining <= 0:
+                # Restore the class method before running the last profiled call
+                target.__dict__.pop(name, None)
+
+        def wrapper(*args, **kwargs):
+            if self._thread == threading.get_ident():
+                # Already inside a profiled cycle, which includes this call
+                count()
+                return original(*args, **kwargs)
+            with self._profile(name) as profiled:
+                if profiled:
+                    count()  # Calls made while another thread is profiled do not count
+                return original(*args, **kwargs)
+
+        setattr(target, name, wrapper)
+        logger.info(f"Profiling the next {calls} call(s) to {name}")
+
+    @contextmanager
+    def _profile(self, label: str) -> Iterator[bool]:
+        """Profile the enclosed block; yields False if another thread is already being profiled."""
+        if not self._lock.acquire(blocking=False):
+            yield False
+            return
+        profile = cProfile.Profile()
+        self._thread = threading.get_ident()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield True
+        finally:
+            profile.disable()
+            self._thread = None
+            self._lock.release()
+            self._dump(profile, label, time.perf_counter() - start)
+
+    def _dump(self, profile: cProfile.Profile, label: str, elapsed: float) -> None:
+        """Write the .prof file and a text summary; failures are logged, not raised."""
+        self._sequence += 1
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        base = os.path.join(self.output_dir, f"{stamp}-{self._sequence:03d}-{label}")
+
+        summary = io.StringIO()
+        stats = pstats.Stats(profile, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(Config.PROFILE_TOP_FUNCTIONS)
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            profile.dump_stats(base + '.prof')
+            with open(base + '.txt', 'w', encoding='utf-8') as f:
+                f.write(f"{label}: {elapsed:.3f}s wall time\n")
+                f.write(summary.getvalue())
+        except OSError as e:
+            logger.warning(f"Failed to write profile for {label}: {e}")
+            return
+
+        logger.info(f"Profiled {label} ({elapsed:.3f}s, {stats.total_calls} calls) -> {base}.prof")
@@ -47,6 +47,14 @@ fi
 echo "🚀 Starting in background..."
 nohup $PYTHON_CMD main.py >> anytime_booking.log 2>&1 &
 PID=$!
+
+# The daemon refuses to start when another instance (e.g. the systemd unit) holds the lock
+sleep 2
+if ! ps -p $PID > /dev/null 2>&1; then
+    echo "❌ Failed to start. Last log entries:"
+    tail -3 anytime_booking.log
+    exit 1
+fi
 echo $PID > sportivity.pid
 
 echo "✅ Started successfully!"
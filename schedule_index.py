@@ -0,0 +1,152 @@
+"""
+Incremental schedule ingestion.
+
+Keeps the last schedule snapshot keyed by lesson ``_id`` together with a
+cheap content fingerprint, so each fetch only reports the lessons that were
+added, removed or changed since the previous one.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fields that influence parsing, matching or booking decisions
+FINGERPRINT_FIELDS = (
+    'LessonStartTime',
+    'LessonEndTime',
+    'UTCStartTime',
+    'UTCEndTime',
+    'Description',
+    'Trainer',
+    'LocationName',
+    'SpotsInt',
+    'MaximumParticipants',
+    'Full',
+    'BookingStatus',
+)
+
+
+def lesson_day(lesson_data: Dict) -> str:
+    """Local start date of a raw lesson as YYYY-MM-DD."""
+    return (lesson_data.get('LessonStartTime') or lesson_data.get('UTCStartTime') or '')[:10]
+
+
+def compact_lesson(lesson_data: Dict) -> Dict:
+    """Copy of a raw lesson with only the fields the scheduler uses."""
+    compact = {'_id': lesson_data.get('_id')}
+    for name in FINGERPRINT_FIELDS:
+        if name in lesson_data:
+            compact[name] = lesson_data[name]
+    return compact
+
+
+def fingerprint(lesson_data: Dict) -> Tuple:
+    """Cheap content fingerprint of a raw lesson."""
+    get = lesson_data.get
+    return tuple([get(name) for name in FINGERPRINT_FIELDS])
+
+
+@dataclass
+class ScheduleDelta:
+    """Differences between two schedule snapshots."""
+    added: List[Dict] = field(default_factory=list)
+    changed: List[Dict] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed"
+
+
+class ScheduleIndex:
+    """Last known schedule snapshot, keyed by lesson ID."""
+
+    def __init__(self):
+        # lesson ID -> (fingerprint, raw lesson, start day, location ID)
+        self._entries: Dict[str, Tuple[Tuple, Dict, str, Optional[str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, lesson_id: str) -> bool:
+        return lesson_id in self._entries
+
+    def get(self, lesson_id: str) -> Dict:
+        """Raw lesson data for an ID, or None if unknown."""
+        entry = self._entries.get(lesson_id)
+        return entry[1] if entry else None
+
+    def lessons(self) -> List[Dict]:
+        """All raw lessons in the current snapshot."""
+        return [entry[1] for entry in self._entries.values()]
+
+    def items(self) -> List[Tuple[Optional[str], Dict]]:
+        """All (location ID, raw lesson) pairs in the current snapshot."""
+        return [(entry[3], entry[1]) for entry in self._entries.values()]
+
+    def location_of(self, lesson_id: str) -> Optional[str]:
+        """Location ID a lesson was fetched from, or None if unknown."""
+        entry = self._entries.get(lesson_id)
+        return entry[3] if entry else None
+
+    def ingest(self, lessons: Iterable[Dict],
+               days: Optional[Tuple[str, str]] = None,
+               location: Optional[str] = None) -> ScheduleDelta:
+        """
+        Merge a newly fetched schedule into the snapshot.
+
+        Lessons are deduplicated by ID, so a lesson returned for more than
+        one location is only tracked once, under the location that reported
+        it first.
+
+        Args:
+            lessons: Raw lesson data from the API
+            days: Inclusive (first, last) YYYY-MM-DD range the fetch covered.
+                Lessons outside the range are kept as they are. None means
+                the fetch covers every day.
+            location: Location the fetch was for. Only lessons of that
+                location can be removed; None means all locations.
+
+        Returns:
+            ScheduleDelta describing what changed since the previous snapshot
+        """
+        delta = ScheduleDelta()
+        entries = self._entries
+        seen = set()
+
+        for lesson_data in lessons:
+            lesson_id = str(lesson_data.get('_id'))
+            fp = fingerprint(lesson_data)
+            seen.add(lesson_id)
+
+            old = entries.get(lesson_id)
+            owner = location
+            if old is None:
+                delta.added.append(lesson_data)
+            else:
+                if old[0] != fp:
+                    delta.changed.append(lesson_data)
+                # A lesson listed by several locations stays with the first one
+                if old[3] is not None:
+                    owner = old[3]
+            entries[lesson_id] = (fp, lesson_data, lesson_day(lesson_data), owner)
+
+        for lesson_id, entry in list(entries.items()):
+            if lesson_id in seen:
+                continue
+            if location is not None and entry[3] != location:
+                continue
+            if days is None or days[0] <= entry[2] <= days[1]:
+                del entries[lesson_id]
+                delta.removed.append(lesson_id)
+
+        if delta:
+            logger.debug(f"Schedule delta: {delta}")
+        return delta
+
+    def clear(self) -> None:
+        """Forget the snapshot so the next ingest reports every lesson as added."""
+        self._entries = {}
@@ -2,124 +2,217 @@
 Scheduling logic for automatic lesson booking.
 """
 import logging
-from typing import List, Dict, Set, Optional
-from datetime import datetime, timedelta, timezone
+import threading
+from typing import Iterable, List, Dict, Set, Optional, Tuple
+from datetime import date, datetime, timedelta
 import time
-from dataclasses import dataclass
 
 from config import Config
-from api_client import APIClient
+from api_client import APIClient, ScheduleError
+from decision_log import (
+    ACTION_BOOKED, ACTION_FAILED, ACTION_FULL, ACTION_RETRY, ACTION_SKIP, ACTION_TARGET, ACTION_WAIT,
+    RULE_BOOKING, RULE_CAPACITY, RULE_PARSE, RULE_SERVER, RULE_WINDOW, DecisionLog,
+)
 from email_notifier import EmailNotifier
+from lesson import LOCAL_TZ, Lesson, now_local, parse_lesson, to_local
+from lesson_rules import RulesWatcher
+from schedule_index import ScheduleIndex, compact_lesson
+from snapshot_archive import SnapshotArchive
+from state_store import StateStore
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class Lesson:
-    """Represents a lesson."""
-    id: str
-    name: str
-    lesson_type: str
-    start_time: datetime
-    duration_minutes: int
-    instructor: str = ""
-    location: str = ""
-    available_spots: int = 0
-    
-    @property
-    def booking_opens_at(self) -> datetime:
-        """Calculate when booking opens for this lesson."""
-        return self.start_time - timedelta(hours=Config.BOOKING_WINDOW_HOURS)
-    
-    @property
-    def target_booking_time(self) -> datetime:
-        """Calculate the earliest time to attempt booking (5 min before window)."""
-        return self.booking_opens_at + timedelta(minutes=Config.BOOKING_BUFFER_MINUTES)
-    
-    @property
-    def booking_window_end(self) -> datetime:
-        """Calculate when to stop trying (47 hours before lesson)."""
-        return self.start_time - timedelta(hours=Config.BOOKING_WINDOW_END_HOURS)
-    
-    def is_bookable_now(self) -> bool:
-        """Check if this lesson is in the booking window (anytime from 48h before until lesson starts)."""
-        now = datetime.now()  # Use naive datetime to match lesson times
-        return now >= self.booking_opens_at and now < self.start_time
-    
-    def is_in_active_booking_window(self) -> bool:
-        """Check if we're in the aggressive booking window (first hour: 48h to 47h before lesson)."""
-        now = datetime.now()  # Use naive datetime to match lesson times
-        # Aggressive window: from 5 min before 48h until 47h before lesson (1 hour window)
-        # This is when we check every 5 minutes to grab spots quickly
-        return now >= self.target_booking_time and now <= self.booking_window_end
-    
-    def should_attempt_booking(self) -> bool:
-        """Check if we should attempt booking this lesson now."""
-        return self.is_in_active_booking_window()
-
-
 class BookingScheduler:
     """Manages automatic booking of lessons."""
     
+    # Public methods the running daemon calls, the ones `run --profile-function` can profile
+    DAEMON_METHODS = (
+        'reload_rules', 'refresh_schedule', 'plan_schedule_fetch', 'evaluate_lesson',
+        'target_lessons', 'get_upcoming_bookable_lessons', 'should_retry_full_lesson',
+        'book_lesson', 'flush_outbox', 'save_state', 'export_state', 'next_cycle_delay',
+    )
+    
     def __init__(self):
         self.api_client = APIClient()
         self.booked_lesson_ids: Set[str] = set()
         self.attempted_lesson_ids: Set[str] = set()
         self.full_lesson_retries: Dict[str, Dict] = {}  # Track retries for full lessons
+        self.decisions = DecisionLog()  # Why lessons were or were not booked
         self.email_notifier = EmailNotifier()
+        self.outbox: List[Dict] = []  # Booking notifications waiting to be sent
+        self._outbox_lock = threading.Lock()  # Bookings may run in worker threads
+        self.rules_watcher = RulesWatcher(Config.LESSON_RULES_FILE)
+        self.api_client.location_id = self.rules.default_location
+        self.schedule_index = ScheduleIndex()
+        self._targets: Dict[str, Lesson] = {}  # Target lessons in the schedule index, by ID
+        self._last_full_refresh: Dict[str, float] = {}  # Location ID -> last full schedule fetch
+        self._last_fetch = 0.0  # Last schedule fetch of any kind, for the age of the cache
+        self.archive = SnapshotArchive(Config.ARCHIVE_FILE) if Config.ENABLE_ARCHIVE else None
+        self.state_store = StateStore(Config.STATE_FILE)
+        self.restore_state(self.state_store.load())
     
-    def parse_lesson(self, lesson_data: Dict) -> Lesson:
+    @property
+    def rules(self):
+        """Currently active lesson rules."""
+        return self.rules_watcher.rules
+    
+    def export_state(self) -> Dict:
+        """Session state and cached schedule as a JSON-serialisable dictionary."""
+        return {
+            'booked_lesson_ids': sorted(self.booked_lesson_ids),
+            'attempted_lesson_ids': sorted(self.attempted_lesson_ids),
+            'full_lesson_retries': {
+                lesson_id: {
+                    'attempts': retry_info['attempts'],
+                    'last_attempt': retry_info['last_attempt'].isoformat() if retry_info['last_attempt'] else None,
+                    'capacity': retry_info['capacity'],
+                    'full': retry_info['full'],
+                }
+                for lesson_id, retry_info in self.full_lesson_retries.items()
+            },
+            'last_full_refresh': self._last_full_refresh,
+            'last_fetch': self._last_fetch,
+            'outbox': list(self.outbox),
+            'schedule': [
+                [location_id, compact_lesson(lesson_data)]
+                for location_id, lesson_data in self.schedule_index.items()
+            ],
+        }
+    
+    def restore_state(self, state: Dict) -> None:
+        """Restore state saved by export_state(), e.g. after a restart."""
+        if not state:
+            return
+        
+        by_location: Dict[str, List[Dict]] = {}
+        for location_id, lesson_data in state.get('schedule', []):
+            by_location.setdefault(location_id, []).append(lesson_data)
+        for location_id, lessons in by_location.items():
+            self.refresh_targets(lessons, location_id=location_id)
+        self._last_full_refresh = dict(state.get('last_full_refresh', {}))
+        self._last_fetch = state.get('last_fetch', max(self._last_full_refresh.values(), default=0.0))
+        self.outbox = list(state.get('outbox', []))
+        
+        # Only keep session state for lessons that are still in the schedule
+        self.booked_lesson_ids = {i for i in state.get('booked_lesson_ids', []) if i in self.schedule_index}
+        self.attempted_lesson_ids = {i for i in state.get('attempted_lesson_ids', []) if i in self.schedule_index}
+        for lesson_id, retry_info in state.get('full_lesson_retries', {}).items():
+            lesson = self._targets.get(lesson_id)
+            if lesson is None:
+                continue
+            last_attempt = retry_info.get('last_attempt')
+            self.full_lesson_retries[lesson_id] = {
+                'lesson': lesson,
+                'attempts': retry_info.get('attempts', 0),
+                'last_attempt': to_local(datetime.fromisoformat(last_attempt)) if last_attempt else None,
+                'capacity': retry_info.get('capacity', lesson.available_spots),
+                'full': retry_info.get('full', True),
+            }
+        
+        logger.info(
+            f"Restored state: {len(self.schedule_index)} lessons, "
+            f"{len(self.booked_lesson_ids)} booked, {len(self.full_lesson_retries)} waiting for a spot"
+        )
+    
+    def save_state(self) -> None:
+        """Persist the current state; failures are logged, not raised."""
+        try:
+            self.state_store.save(self.export_state())
+        except Exception as e:
+            logger.warning(f"Failed to save scheduler state: {e}")
+    
+    def reload_rules(self, force: bool = False) -> bool:
+        """
+        Reload the lesson rules file if it changed on disk.
+        
+        Retry tracking for lessons that are no longer wanted is dropped, so
+        the next cycle works from the new rules without losing other state.
+        
+        Args:
+            force: Reload even if the file looks unchanged
+        
+        Returns:
+            True if new rules were loaded, False otherwise
+        """
+        previous_types = self.rules.types
+        if not self.rules_watcher.poll(force):
+            return False
+        self._rules_changed(previous_types)
+        self.api_client.location_id = self.rules.default_location
+        
+        for lesson_id, retry_info in list(self.full_lesson_retries.items()):
+            lesson = retry_info['lesson']
+            if not self.rules.matches(lesson.lesson_type, lesson.weekday, lesson.start_hhmm, lesson.location_id):
+                logger.info(f"{lesson.name} at {lesson.start_time} no longer matches the rules, stop retrying")
+                del self.full_lesson_retries[lesson_id]
+        return True
+    
+    def parse_lesson(self, lesson_data: Dict, location_id: str = None) -> Lesson:
         """
         Parse lesson data from Sportivity API response.
         
         Args:
             lesson_data: Raw lesson data from API
+            location_id: Location the lesson was fetched for (defaults to the first location)
             
         Returns:
             Lesson object
         """
-        from dateutil import parser
-        
-        # Use local time (LessonStartTime) for lesson scheduling
-        # This ensures times match user's expectations (09:30, 10:30, etc.)
-        local_start = lesson_data.get('LessonStartTime')
-        local_end = lesson_data.get('LessonEndTime')
+        return parse_lesson(lesson_data, location_id or self.rules.default_location)
+    
+    def evaluate_lesson(self, lesson_data: Dict, location_id: str = None) -> Optional[Lesson]:
+        """
+        Check a raw lesson against the lesson rules of its location.
         
-        if local_start:
-            start_time = parser.parse(local_start)
-        else:
-            # Fallback to UTC
-            start_time = parser.isoparse(lesson_data.get('UTCStartTime'))
+        Only looks at the lesson content, not at what happened in this session,
+        so the result can be cached until the lesson or the rules change.
         
-        if local_end:
-            end_time = parser.parse(local_end)
-        else:
-            end_time = parser.isoparse(lesson_data.get('UTCEndTime'))
-        
-        duration = int((end_time - start_time).total_seconds() / 60)
-        
-        # Calculate available spots
-        max_participants = lesson_data.get('MaximumParticipants', 0)
-        spots_taken = lesson_data.get('SpotsInt', 0)
-        available_spots = max_participants - spots_taken
-        
-        return Lesson(
-            id=str(lesson_data.get('_id')),  # Lesson ID
-            name=lesson_data.get('Description', ''),  # Lesson type/name
-            lesson_type=lesson_data.get('Description', ''),  # Same as name
-            start_time=start_time,
-            duration_minutes=duration,
-            instructor=lesson_data.get('Trainer', ''),
-            location=lesson_data.get('LocationName', ''),
-            available_spots=available_spots
-        )
+        Args:
+            lesson_data: Raw lesson data from API
+            location_id: Location the lesson was fetched for (defaults to the first location)
+            
+        Returns:
+            Lesson object if it is a target lesson, None otherwise
+        """
+        # Skip if already booked or cancelled by user; otherwise type, day
+        # and time must all match the rules of the lesson's location
+        lesson, rule = self.rules.check(lesson_data, location_id)
+        self.decisions.record_change(str(lesson_data.get('_id')), rule, ACTION_TARGET if lesson else ACTION_SKIP)
+        if lesson:
+            logger.debug(f"Target lesson found: {lesson.name} on {lesson.start_time}")
+        return lesson
+    
+    def _rules_changed(self, previous_types) -> None:
+        """Re-evaluate the cached schedule after the lesson rules changed."""
+        # Every cached match decision depends on the rules
+        self._targets = {}
+        self._update_targets(self.schedule_index.items())
+        
+        if not self.rules.types <= previous_types:
+            # Lessons of the new types were skipped by the fetch prefilter
+            logger.info("New lesson types in the rules - fetching the full schedule next cycle")
+            self._last_full_refresh = {}
+    
+    def _is_pending(self, lesson: Lesson) -> bool:
+        """Check that a target lesson still needs work in this session."""
+        # Skip if already booked, or attempted in this session and not waiting for a spot
+        if lesson.id in self.booked_lesson_ids:
+            return False
+        if lesson.id in self.attempted_lesson_ids and lesson.id not in self.full_lesson_retries:
+            return False
+        return True
     
-    def filter_target_lessons(self, lessons: List[Dict]) -> List[Lesson]:
+    def filter_target_lessons(self, lessons: Iterable[Dict], location_id: str = None) -> List[Lesson]:
         """
         Filter lessons to only include target lesson types on specific days/times.
         
+        Parses every lesson; the scheduler loop uses refresh_targets() instead,
+        which only re-evaluates lessons that changed since the last fetch.
+        
         Args:
-            lessons: List of raw lesson data
+            lessons: Raw lesson data (any iterable, e.g. a streamed schedule)
+            location_id: Location the lessons were fetched for (defaults to the first location)
             
         Returns:
             List of Lesson objects matching target types and schedule
@@ -128,52 +221,192 @@ class BookingScheduler:
         
         for lesson_data in lessons:
             try:
-                # Skip if already booked or cancelled by user
-                booking_status = lesson_data.get('BookingStatus')
-                if booking_status:
-                    logger.debug(f"Skipping lesson with status '{booking_status}': {lesson_data.get('Description')} at {lesson_data.get('LessonStartTime')}")
-                    continue
-                
-                lesson = self.parse_lesson(lesson_data)
-                
-                # Skip if already attempted or booked in this session
-                if lesson.id in self.booked_lesson_ids or lesson.id in self.attempted_lesson_ids:
-                    continue
-                
-                # Check if this is a lesson type we want to book
-                if lesson.lesson_type not in Config.LESSON_TYPES:
-                    continue
-                
-                # Check if the lesson matches our schedule (day and time)
-                # Use local time from LessonStartTime for comparison (not UTC)
-                local_start = lesson_data.get('LessonStartTime')
-                if local_start:
-                    from dateutil import parser
-                    local_time = parser.parse(local_start)
-                    day_of_week = local_time.weekday()
-                    lesson_time = local_time.strftime('%H:%M')
-                else:
-                    day_of_week = lesson.start_time.weekday()
-                    lesson_time = lesson.start_time.strftime('%H:%M')
-                
-                if day_of_week in Config.LESSON_SCHEDULE:
-                    # Check if this lesson matches the schedule for this day
-                    matches_schedule = any(
-                        schedule['type'] == lesson.lesson_type and schedule['time'] == lesson_time
-                        for schedule in Config.LESSON_SCHEDULE[day_of_week]
-                    )
-                    
-                    if matches_schedule:
-                        target_lessons.append(lesson)
-                        logger.debug(f"Target lesson found: {lesson.name} on {lesson.start_time}")
-                # Only book lessons that are explicitly in LESSON_SCHEDULE (day + time + type must match)
-                        
+                lesson = self.evaluate_lesson(lesson_data, location_id)
+                if lesson and self._is_pending(lesson):
+                    target_lessons.append(lesson)
             except Exception as e:
                 logger.error(f"Error parsing lesson: {e}")
+                self.decisions.record_change(str(lesson_data.get('_id')), RULE_PARSE, ACTION_SKIP)
                 continue
         
         return target_lessons
     
+    def _update_targets(self, lessons: List[Tuple[str, Dict]]) -> None:
+        """Re-evaluate the given (location ID, raw lesson) pairs and update the target cache."""
+        for location_id, lesson_data in lessons:
+            lesson_id = str(lesson_data.get('_id'))
+            try:
+                lesson = self.evaluate_lesson(lesson_data, location_id)
+            except Exception as e:
+                logger.error(f"Error parsing lesson: {e}")
+                self.decisions.record_change(lesson_id, RULE_PARSE, ACTION_SKIP)
+                lesson = None
+            if lesson:
+                self._targets[lesson_id] = lesson
+            else:
+                self._targets.pop(lesson_id, None)
+    
+    def refresh_targets(self, schedule_data: List[Dict],
+                        days: Optional[Tuple[date, date]] = None,
+                        location_id: str = None) -> List[Lesson]:
+        """
+        Ingest a fetched schedule and return the pending target lessons.
+        
+        Only lessons that were added or changed since the previous fetch are
+        parsed and matched again; unchanged lessons come from the cache.
+        Lessons of all locations end up in one index, deduplicated by ID.
+        
+        Args:
+            schedule_data: List of raw lesson data
+            days: Date range of a partial fetch to merge into the cached
+                schedule; None replaces the whole schedule of the location
+            location_id: Location the schedule was fetched for (defaults to the first location)
+            
+        Returns:
+            List of Lesson objects matching target types and schedule
+        """
+        if not schedule_data and len(self.schedule_index):
+            # get_schedule() returns an empty list on errors; keep the last snapshot
+            logger.warning("Empty schedule received, keeping previous snapshot")
+        else:
+            self._ingest(schedule_data, days, location_id)
+        
+        return self.target_lessons()
+    
+    def _ingest(self, schedule_data: List[Dict], days: Optional[Tuple[date, date]] = None,
+                location_id: str = None) -> None:
+        """Merge a successfully fetched schedule into the index and update the target cache."""
+        location_id = location_id or self.rules.default_location
+        day_range = (days[0].isoformat(), days[1].isoformat()) if days else None
+        delta = self.schedule_index.ingest(schedule_data, day_range, location_id)
+        for lesson_id in delta.removed:
+            self._targets.pop(lesson_id, None)
+        self._update_targets([(location_id, lesson_data) for lesson_data in delta.added])
+        # A lesson listed by several locations is judged by the rules of the location that owns it
+        index = self.schedule_index
+        self._update_targets([
+            (index.location_of(str(lesson_data.get('_id'))) or location_id, lesson_data)
+            for lesson_data in delta.changed
+        ])
+        if delta:
+            logger.info(f"Schedule changes: {delta}")
+    
+    def target_lessons(self) -> List[Lesson]:
+        """Pending target lessons from the last fetched schedule (no API call)."""
+        return [lesson for lesson in self._targets.values() if self._is_pending(lesson)]
+    
+    def plan_schedule_fetch(self, now: Optional[float] = None) -> List[Tuple[str, date, date, bool]]:
+        """
+        Pick the smallest set of schedule requests worth making this cycle.
+        
+        Each location's full lookahead is fetched on its own cadence
+        (refresh_minutes in the rules file). In between, only the days of
+        pending target lessons whose booking window is open or opens before the
+        next poll are fetched. Due full refreshes are planned every cycle, also
+        while deadlines are hot, so new lessons, types and locations are still
+        discovered. At most one overdue location is fully refreshed per cycle
+        (plus locations never fetched), so adding locations does not multiply
+        the requests.
+        
+        Returns:
+            List of (location_id, start_date, end_date, full) tuples, empty if no fetch is needed
+        """
+        now = time.time() if now is None else now
+        today = datetime.fromtimestamp(now, LOCAL_TZ).date()
+        
+        # Full refreshes: every location that was never fetched, otherwise the most overdue one
+        due = []
+        for location in self.rules.locations.values():
+            last = self._last_full_refresh.get(location.id, 0.0)
+            overdue = now - last - location.refresh_minutes * 60
+            if overdue >= 0:
+                due.append((last == 0.0, overdue, location.id))
+        full = [location_id for first, _, location_id in due if first]
+        if due and not full:
+            full = [max(due)[2]]
+        
+        # Days with upcoming deadlines, per location; a full refresh covers them already
+        horizon = now + Config.RETRY_INTERVAL_MINUTES * 60
+        hot_days: Dict[str, List[date]] = {}
+        for lesson in self.target_lessons():
+            if lesson.target_ts <= horizon and lesson.start_ts > now and lesson.location_id not in full:
+                hot_days.setdefault(lesson.location_id, []).append(lesson.start_time.date())
+        
+        end = today + timedelta(days=Config.SCHEDULE_LOOKAHEAD_DAYS)
+        plan = [(location_id, min(days), max(days), False) for location_id, days in hot_days.items()]
+        plan.extend((location_id, today, end, True) for location_id in full)
+        return plan
+    
+    def refresh_schedule(self) -> List[Lesson]:
+        """
+        Fetch the planned parts of the schedule and merge them into the cache.
+        
+        Returns:
+            List of pending target lessons
+        """
+        plan = self.plan_schedule_fetch()
+        if not plan:
+            logger.info("No deadlines coming up, using cached schedule")
+            return self.target_lessons()
+        
+        for location_id, start_date, end_date, full in plan:
+            schedule_data = self._fetch_schedule(location_id, start_date, end_date)
+            if schedule_data is None:
+                continue  # Keep the last snapshot
+            self._last_fetch = time.time()
+            if full:
+                self._last_full_refresh[location_id] = time.time()
+                self._ingest(schedule_data, location_id=location_id)
+            else:
+                self._ingest(schedule_data, days=(start_date, end_date), location_id=location_id)
+        
+        return self.target_lessons()
+    
+    def _prefilter(self, lesson_data: Dict) -> bool:
+        """Cheap check whether a raw lesson can matter: a wanted type, or booked/cancelled by the user."""
+        return lesson_data.get('Description') in self.rules.types or bool(lesson_data.get('BookingStatus'))
+    
+    def _fetch_schedule(self, location_id: str, start_date: date, end_date: date) -> Optional[List[Dict]]:
+        """
+        Stream one schedule fetch through the archive and the prefilter.
+        
+        Every lesson is recorded in the history archive, but only compact
+        copies of lessons that pass _prefilter() are kept, so memory depends
+        on the number of relevant lessons rather than on the response size.
+        
+        Returns:
+            Compact relevant lessons, or None if the fetch failed
+        """
+        recorder = None
+        if self.archive is not None:
+            # Never fail the cycle because of the archive
+            try:
+                recorder = self.archive.recorder()
+            except Exception as e:
+                logger.warning(f"Schedule archive unavailable, not recording this fetch: {e}")
+        kept = []
+        try:
+            for lesson_data in self.api_client.iter_schedule(
+                start_date=datetime.combine(start_date, datetime.min.time()),
+                end_date=datetime.combine(end_date, datetime.min.time()),
+                location_id=location_id
+            ):
+                if recorder is not None:
+                    recorder.add(lesson_data)
+                if self._prefilter(lesson_data):
+                    kept.append(compact_lesson(lesson_data))
+        except ScheduleError as e:
+            logger.error(f"{e} - keeping previous snapshot")
+            return None
+        
+        if recorder is not None:
+            # Never fail the cycle because of the archive
+            try:
+                recorder.commit()
+            except Exception as e:
+                logger.warning(f"Failed to archive schedule snapshot: {e}")
+        return kept
+    
     def get_upcoming_bookable_lessons(self) -> List[Lesson]:
         """
         Get lessons that are ready to be booked (including retries for full lessons).
@@ -181,14 +414,21 @@ class BookingScheduler:
         Returns:
             List of Lesson objects ready for booking
         """
-        schedule_data = self.api_client.get_schedule()
-        all_lessons = self.filter_target_lessons(schedule_data)
+        all_lessons = self.refresh_schedule()
+        
+        self._prune_full_lesson_retries()
         
+        now = time.time()
         bookable_lessons = []
         for lesson in all_lessons:
             # Bookable if window is open (anytime from 48h before until lesson starts)
-            if lesson.is_bookable_now():
-                bookable_lessons.append(lesson)
+            if not lesson.is_bookable_now(now):
+                self.decisions.record_change(lesson.id, RULE_WINDOW, ACTION_WAIT)
+                continue
+            # Full lessons are only retried when their capacity has changed
+            if lesson.id in self.full_lesson_retries and not self.should_retry_full_lesson(lesson, now):
+                continue
+            bookable_lessons.append(lesson)
         
         logger.info(f"Found {len(bookable_lessons)} lessons ready for booking")
         return bookable_lessons
@@ -214,12 +454,9 @@ class BookingScheduler:
                 if booking_status == 'Gereserveerd':
                     logger.info(f"✓ Lesson {lesson.name} at {lesson.start_time} is already booked (Status: {booking_status})")
                     self.booked_lesson_ids.add(lesson.id)
-                    # Send email notification
-                    self.email_notifier.send_booking_success(
-                        lesson.name, 
-                        lesson.start_time,
-                        lesson.instructor
-                    )
+                    self.full_lesson_retries.pop(lesson.id, None)
+                    self.decisions.record(lesson.id, RULE_SERVER, ACTION_BOOKED)
+                    self._queue_booking_notification(lesson)
                     return True  # Already booked successfully
                 elif booking_status == 'Afgemeld_door_klant':
                     logger.info(f"Lesson {lesson.name} was cancelled, will attempt to re-book")
@@ -232,88 +469,153 @@ class BookingScheduler:
             is_full = lesson_details.get('Full', False)
             if is_full and lesson.available_spots <= 0:
                 logger.warning(f"Lesson {lesson.name} is full. Will retry later.")
+                self.decisions.record(lesson.id, RULE_SERVER, ACTION_FULL)
                 self._track_full_lesson_retry(lesson)
                 return False
         
-        # Format lesson start time as UTC ISO string expected by API: 2025-11-03T19:00:00.000Z
-        try:
-            start_utc = lesson.start_time
-            if start_utc.tzinfo is None:
-                # assume local -> convert to UTC
-                start_utc = start_utc.replace(tzinfo=timezone.utc)
-            start_utc = start_utc.astimezone(timezone.utc)
-            lesson_date_iso = start_utc.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-        except Exception:
-            # Fallback: use naive isoformat
-            lesson_date_iso = lesson.start_time.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-
-        success = self.api_client.book_lesson(lesson.id, lesson_date_iso)
+        # UTC start time computed once when the lesson was parsed
+        success = self.api_client.book_lesson(lesson.id, lesson.lesson_date_iso)
         
         if success:
             self.booked_lesson_ids.add(lesson.id)
+            self.full_lesson_retries.pop(lesson.id, None)
+            self.decisions.record(lesson.id, RULE_BOOKING, ACTION_BOOKED)
             logger.info(f"✓ Booked: {lesson.name} at {lesson.start_time}")
-            # Send email notification
-            self.email_notifier.send_booking_success(
-                lesson.name,
-                lesson.start_time,
-                lesson.instructor
-            )
+            self._queue_booking_notification(lesson)
         else:
             logger.warning(f"✗ Failed to book: {lesson.name} at {lesson.start_time}")
-            self._track_full_lesson_retry(lesson)
+            self.decisions.record(lesson.id, RULE_BOOKING, ACTION_FAILED)
+            # Only a full lesson waits for its capacity to change; other failures are retried on a timer
+            is_full = lesson.available_spots <= 0 or bool(lesson_details and lesson_details.get('Full'))
+            self._track_full_lesson_retry(lesson, full=is_full)
         
         return success
     
-    def _track_full_lesson_retry(self, lesson: Lesson):
-        """Track retry attempts for full lessons."""
+    def _queue_booking_notification(self, lesson: Lesson) -> None:
+        """Queue a booking confirmation; it is sent by flush_outbox()."""
+        with self._outbox_lock:
+            self.outbox.append({
+                'lesson_name': lesson.name,
+                'lesson_time': lesson.start_time.isoformat(),
+                'instructor': lesson.instructor,
+                'attempts': 0,
+            })
+    
+    def flush_outbox(self) -> None:
+        """
+        Send queued booking notifications.
+        
+        Sending is kept out of the booking path so a slow mail server never
+        delays a booking. Failed messages stay queued (and are saved with the
+        state) until they have failed OUTBOX_MAX_ATTEMPTS times.
+        """
+        with self._outbox_lock:
+            messages, self.outbox = self.outbox, []
+        if not messages or not Config.ENABLE_EMAIL:
+            return
+        
+        pending = []
+        for message in messages:
+            sent = self.email_notifier.send_booking_success(
+                message['lesson_name'],
+                datetime.fromisoformat(message['lesson_time']),
+                message['instructor']
+            )
+            if sent:
+                continue
+            message['attempts'] += 1
+            if message['attempts'] >= Config.OUTBOX_MAX_ATTEMPTS:
+                logger.warning(f"Giving up on booking notification for {message['lesson_name']}")
+                continue
+            pending.append(message)
+        with self._outbox_lock:
+            self.outbox[:0] = pending
+    
+    def _track_full_lesson_retry(self, lesson: Lesson, full: bool = True):
+        """
+        Track retry attempts for a lesson that could not be booked.
+        
+        Args:
+            lesson: Lesson that was attempted
+            full: The lesson was full (retry when its capacity changes);
+                otherwise the attempt failed for another reason (retry on a timer)
+        """
         if lesson.id not in self.full_lesson_retries:
             self.full_lesson_retries[lesson.id] = {
                 'lesson': lesson,
                 'attempts': 0,
                 'last_attempt': None,
-                'retry_hours': []
+                'capacity': lesson.available_spots,
+                'full': full,
             }
         
-        now = datetime.now()  # Use naive datetime
         retry_info = self.full_lesson_retries[lesson.id]
         retry_info['attempts'] += 1
-        retry_info['last_attempt'] = now
-        
-        current_hour = now.hour
-        if current_hour not in retry_info['retry_hours']:
-            retry_info['retry_hours'].append(current_hour)
-        
-        logger.info(f"Full lesson retry tracking: {lesson.name} - Attempt {retry_info['attempts']}")
+        retry_info['last_attempt'] = now_local()
+        retry_info['capacity'] = lesson.available_spots
+        retry_info['full'] = full
+        
+        if full:
+            logger.info(
+                f"Full lesson retry tracking: {lesson.name} - Attempt {retry_info['attempts']}, "
+                f"waiting for capacity to change from {lesson.available_spots}"
+            )
+        else:
+            logger.info(f"Failed attempt {retry_info['attempts']} for {lesson.name} - will retry on a timer")
     
-    def should_retry_full_lesson(self, lesson: Lesson) -> bool:
-        """Check if we should retry booking a full lesson."""
+    def should_retry_full_lesson(self, lesson: Lesson, now: Optional[float] = None) -> bool:
+        """
+        Check if we should retry booking a lesson that could not be booked.
+        
+        Full lessons are only retried when the free capacity in the latest
+        schedule snapshot differs from the capacity at the last attempt and a
+        spot is open. Other failures are retried every RETRY_INTERVAL_MINUTES
+        during the active booking window and every FAILED_RETRY_MINUTES after it.
+        """
         if lesson.id not in self.full_lesson_retries:
             return True  # First attempt
         
         retry_info = self.full_lesson_retries[lesson.id]
-        now = datetime.now()  # Use naive datetime
-        current_hour = now.hour
-        
-        # Check if we've hit max retries for the day
-        if retry_info['attempts'] >= Config.MAX_RETRIES_FOR_FULL_LESSON:
-            logger.debug(f"Max retries reached for {lesson.name}")
-            return False
+        retry_info['lesson'] = lesson
         
-        # Check if we should retry at this hour (9am, 12pm, 3pm, 6pm)
-        if current_hour in Config.RETRY_HOURS and current_hour not in retry_info['retry_hours']:
-            logger.info(f"Retry hour {current_hour}:00 - will attempt {lesson.name} again")
+        if not retry_info['full']:
+            now = time.time() if now is None else now
+            if lesson.is_in_active_booking_window(now):
+                interval = Config.RETRY_INTERVAL_MINUTES
+            else:
+                interval = Config.FAILED_RETRY_MINUTES
+            last_attempt = retry_info['last_attempt']
+            if last_attempt and now - last_attempt.timestamp() < interval * 60:
+                self.decisions.record_change(lesson.id, RULE_BOOKING, ACTION_WAIT)
+                return False
+            logger.info(f"Retrying {lesson.name} after a failed attempt")
+            self.decisions.record(lesson.id, RULE_BOOKING, ACTION_RETRY)
             return True
         
-        # During active booking window (48h-47h), retry every 5 minutes
-        if lesson.is_in_active_booking_window():
-            if retry_info['last_attempt']:
-                time_since_last = (now - retry_info['last_attempt']).total_seconds() / 60
-                if time_since_last >= Config.RETRY_INTERVAL_MINUTES:
-                    return True
-            else:
-                return True
+        capacity = lesson.available_spots
+        previous = retry_info['capacity']
+        
+        if capacity == previous:
+            logger.debug(f"Capacity unchanged for {lesson.name} ({capacity}), not retrying")
+            self.decisions.record_change(lesson.id, RULE_CAPACITY, ACTION_WAIT)
+            return False
+        
+        retry_info['capacity'] = capacity
+        if capacity <= 0:
+            logger.debug(f"Capacity changed for {lesson.name} ({previous} -> {capacity}) but still full")
+            self.decisions.record_change(lesson.id, RULE_CAPACITY, ACTION_FULL)
+            return False
         
-        return False
+        logger.info(f"Capacity changed for {lesson.name} ({previous} -> {capacity}) - will attempt again")
+        self.decisions.record(lesson.id, RULE_CAPACITY, ACTION_RETRY)
+        return True
+    
+    def _prune_full_lesson_retries(self) -> None:
+        """Stop tracking retries for lessons that have already started."""
+        now = time.time()
+        for lesson_id, retry_info in list(self.full_lesson_retries.items()):
+            if retry_info['lesson'].start_ts <= now:
+                del self.full_lesson_retries[lesson_id]
     
     def process_bookings(self) -> Dict[str, int]:
         """
@@ -331,27 +633,30 @@ class BookingScheduler:
             'failed': 0
         }
         
+        # Bookings are paced by the API client's rate limiter
         for lesson in lessons:
             success = self.book_lesson(lesson)
             if success:
                 stats['booked'] += 1
             else:
                 stats['failed'] += 1
-            
-            # Small delay between bookings to appear more human
-            time.sleep(2)
         
         return stats
     
-    def get_next_booking_window(self) -> Optional[datetime]:
+    def get_next_booking_window(self, refresh: bool = True) -> Optional[datetime]:
         """
         Calculate when the next booking window opens.
         
+        Args:
+            refresh: Fetch the schedule first; otherwise use the last fetched one
+        
         Returns:
             DateTime of next booking window, or None if no upcoming lessons
         """
-        schedule_data = self.api_client.get_schedule()
-        all_lessons = self.filter_target_lessons(schedule_data)
+        if refresh:
+            all_lessons = self.refresh_schedule()
+        else:
+            all_lessons = self.target_lessons()
         
         # Find lessons that haven't been booked yet
         unboked_lessons = [
@@ -364,59 +669,52 @@ class BookingScheduler:
             return None
         
         # Find the earliest booking window
-        next_lesson = min(unboked_lessons, key=lambda l: l.target_booking_time)
+        next_lesson = min(unboked_lessons, key=lambda l: l.target_ts)
         return next_lesson.target_booking_time
     
-    def run_continuous(self) -> None:
+    def _next_deadline(self, now: float) -> Optional[float]:
+        """Epoch time of the next future target or opening time of a pending lesson, or None."""
+        upcoming = [
+            moment
+            for lesson in self.target_lessons()
+            for moment in (lesson.target_ts, lesson.opens_ts)
+            if moment > now
+        ]
+        return min(upcoming, default=None)
+    
+    def next_cycle_delay(self, now: Optional[float] = None) -> float:
         """
-        Run the booking scheduler continuously.
-        Uses aggressive 5-minute checks during active booking windows (48h-47h before lessons).
+        Seconds until the next booking cycle is due.
+        
+        Uses aggressive 5-minute checks during active booking windows
+        (5 min before 48h until 47h before lessons) or while retries are
+        tracked, and wakes up in time for the next target or opening time
+        instead of overshooting it. Times already passed are ignored, so a
+        lesson between its target time and its opening never causes a
+        busy loop.
         """
-        logger.info("Starting continuous booking scheduler with aggressive retry logic...")
-        logger.info(f"Active booking window: {Config.BOOKING_BUFFER_MINUTES} min before to {Config.BOOKING_WINDOW_END_HOURS}h before lesson")
-        logger.info(f"Retry interval during window: {Config.RETRY_INTERVAL_MINUTES} minutes")
-        logger.info(f"Daily retry attempts for full lessons: {Config.MAX_RETRIES_FOR_FULL_LESSON} times at hours {Config.RETRY_HOURS}")
+        now = time.time() if now is None else now
         
-        while True:
-            try:
-                stats = self.process_bookings()
-                logger.info(
-                    f"Booking cycle complete: "
-                    f"{stats['booked']} booked, "
-                    f"{stats['failed']} failed, "
-                    f"{stats['checked']} checked"
-                )
-                
-                # Show active retry tracking
-                if self.full_lesson_retries:
-                    logger.info(f"Tracking {len(self.full_lesson_retries)} lessons with retries")
-                
-                # Show next booking window
-                next_window = self.get_next_booking_window()
-                if next_window:
-                    now = datetime.now()  # Use naive datetime
-                    time_until = next_window - now
-                    logger.info(f"Next booking window in: {time_until}")
-                
-                # Dynamic sleep interval: 5 minutes during active windows, 15 minutes otherwise
-                schedule_data = self.api_client.get_schedule()
-                all_lessons = self.filter_target_lessons(schedule_data)
-                
-                has_active_window = any(lesson.is_in_active_booking_window() for lesson in all_lessons)
-                
-                if has_active_window or self.full_lesson_retries:
-                    sleep_minutes = Config.RETRY_INTERVAL_MINUTES
-                    logger.info(f"⚡ Active booking window detected - checking every {sleep_minutes} minutes")
-                else:
-                    sleep_minutes = Config.CHECK_INTERVAL_MINUTES
-                    logger.info(f"Sleeping for {sleep_minutes} minutes...")
-                
-                time.sleep(sleep_minutes * 60)
-                
-            except KeyboardInterrupt:
-                logger.info("Scheduler stopped by user")
-                break
-            except Exception as e:
-                logger.error(f"Error in booking cycle: {e}", exc_info=True)
-                logger.info("Continuing after error...")
-                time.sleep(60)  # Wait a minute before retrying
+        # Show active retry tracking
+        if self.full_lesson_retries:
+            logger.info(f"Tracking {len(self.full_lesson_retries)} lessons with retries")
+        
+        # Show next booking deadline
+        next_deadline = self._next_deadline(now)
+        if next_deadline:
+            logger.info(f"Next booking deadline in: {timedelta(seconds=round(next_deadline - now))}")
+        
+        # Dynamic sleep interval: 5 minutes during active windows, 15 minutes otherwise
+        has_active_window = any(lesson.is_in_active_booking_window(now) for lesson in self.target_lessons())
+        
+        if has_active_window or self.full_lesson_retries:
+            sleep_minutes = Config.RETRY_INTERVAL_MINUTES
+            logger.info(f"⚡ Active booking window detected - checking every {sleep_minutes} minutes")
+        else:
+            sleep_minutes = Config.CHECK_INTERVAL_MINUTES
+            logger.info(f"Sleeping for {sleep_minutes} minutes...")
+        
+        sleep_seconds = sleep_minutes * 60
+        if next_deadline:
+            sleep_seconds = min(sleep_seconds, max(1.0, next_deadline - now))
+        return sleep_seconds
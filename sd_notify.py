@@ -0,0 +1,54 @@
+"""
+Minimal systemd notification support (sd_notify protocol).
+
+Talks to the socket in ``$NOTIFY_SOCKET`` directly, so no systemd Python
+bindings are needed. When the service is not started by systemd with
+``Type=notify`` every call is a no-op.
+"""
+import logging
+import os
+import socket
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def notify(message: str) -> bool:
+    """
+    Send a status message such as ``READY=1`` or ``WATCHDOG=1`` to systemd.
+
+    Returns:
+        True if the message was sent, False if there is no notify socket
+    """
+    address = os.getenv('NOTIFY_SOCKET')
+    if not address:
+        return False
+    if address.startswith('@'):
+        # Abstract namespace socket
+        address = '\0' + address[1:]
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(message.encode('utf-8'))
+    except OSError as e:
+        logger.debug(f"sd_notify failed: {e}")
+        return False
+    return True
+
+
+def watchdog_interval() -> Optional[float]:
+    """
+    Seconds between watchdog pings, half of ``WatchdogSec``.
+
+    Returns:
+        Interval in seconds, or None if the watchdog is not enabled for this process
+    """
+    usec = os.getenv('WATCHDOG_USEC')
+    pid = os.getenv('WATCHDOG_PID')
+    if not usec or (pid and pid != str(os.getpid())):
+        return None
+    try:
+        return int(usec) / 2_000_000
+    except ValueError:
+        return None
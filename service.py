@@ -0,0 +1,393 @@
+"""
+asyncio runtime for the booking scheduler.
+
+One event loop runs the booking cycles and the timer until the next booking
+window, the lesson rules watcher, the notification outbox, the systemd
+watchdog and a small local status endpoint. Blocking work (HTTP, SMTP, disk)
+runs in worker threads via ``asyncio.to_thread``, so a slow mail server or
+state write never holds up a booking deadline.
+
+Outbound API load does not change: the API client allows at most
+``API_CONCURRENCY`` requests in flight and paces them with its rate limiter,
+and bookings are started one after another in deadline order.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from config import Config
+from decision_log import describe
+from lesson import LOCAL_TZ, Lesson
+from profiling import Profiler
+from sd_notify import notify, watchdog_interval
+
+logger = logging.getLogger(__name__)
+
+EXIT_FORCED_STOP = 1  # Second stop signal while a cycle was running
+
+
+class BookingService:
+    """Runs a BookingScheduler on a single asyncio event loop."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.profiler = Profiler()
+        self.started_at = time.time()
+        self.last_cycle: Dict = {}
+        self.preflight: Optional[Dict] = None  # Startup check results, set by main.py
+        self.next_cycle_at: Optional[float] = None
+        self._cycle_started: Optional[float] = None  # Monotonic start of the running cycle
+        self._reload_requested = False
+        self._watchdog_interval = watchdog_interval()
+        self._stop: Optional[asyncio.Event] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._outbox_ready: Optional[asyncio.Event] = None
+        self._cycle_lock: Optional[asyncio.Lock] = None  # Rules reloads never overlap a cycle
+        self._cycle_thread: Optional[asyncio.Future] = None  # Blocking part of the running cycle
+        self._scheduler_status: Dict = {}  # Snapshot for status(), see _snapshot_status()
+
+    @property
+    def stopping(self) -> bool:
+        """True once a stop has been requested."""
+        return self._stop is not None and self._stop.is_set()
+
+    def run(self) -> None:
+        """Run until SIGTERM/SIGINT, then flush notifications and state."""
+        asyncio.run(self._main())
+
+    # Requests from signal handlers (run on the event loop)
+
+    def request_stop(self, signum: int = signal.SIGTERM) -> None:
+        """Stop after the current step; a second request exits at once without saving state."""
+        if self.stopping:
+            # The cycle thread cannot be interrupted, and saving state while it
+            # books would record a half-finished cycle: leave the state file as it is
+            logger.warning("Second stop request, exiting without waiting for the running cycle")
+            notify('STOPPING=1')
+            logging.shutdown()
+            os._exit(EXIT_FORCED_STOP)
+        logger.info(f"Received {signal.Signals(signum).name}, shutting down...")
+        self._stop.set()
+        self._wake.set()
+
+    def request_reload(self) -> None:
+        """Save state and reload the lesson rules before the next cycle, starting it now."""
+        self._reload_requested = True
+        self._wake.set()
+
+    def request_profile(self) -> None:
+        """Profile the next cycle(s)."""
+        self.profiler.request_cycles(Config.PROFILE_SIGNAL_CYCLES)
+
+    def _install_signal_handlers(self, loop: asyncio.AbstractEventLoop) -> None:
+        handlers = [
+            ('SIGTERM', self.request_stop, (signal.SIGTERM,)),
+            ('SIGINT', self.request_stop, (signal.SIGINT,)),
+            ('SIGHUP', self.request_reload, ()),
+            ('SIGUSR1', self.request_profile, ()),
+        ]
+        for name, handler, args in handlers:
+            if not hasattr(signal, name):
+                continue
+            try:
+                loop.add_signal_handler(getattr(signal, name), handler, *args)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not supported on this platform or not the main thread
+
+    # Main loop
+
+    async def _main(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._outbox_ready = asyncio.Event()
+        self._cycle_lock = asyncio.Lock()
+        self._install_signal_handlers(loop)
+
+        helpers = [
+            asyncio.create_task(self._watch_rules()),
+            asyncio.create_task(self._outbox_worker()),
+            asyncio.create_task(self._watchdog()),
+        ]
+        self._snapshot_status()  # No cycle is running yet
+        server = await self._start_status_server()
+        notify('READY=1')
+
+        try:
+            await self._booking_loop()
+        except asyncio.CancelledError:
+            logger.info("Booking cycle cancelled")
+        finally:
+            for task in helpers:
+                task.cancel()
+            await asyncio.gather(*helpers, return_exceptions=True)
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+            notify('STOPPING=1')
+            if self._cycle_thread is not None and not self._cycle_thread.done():
+                # Cancelled mid-cycle: the worker thread is still booking, save what it did
+                logger.info("Waiting for the running booking cycle to finish...")
+                await asyncio.wait([self._cycle_thread])
+            await asyncio.to_thread(self._shutdown)
+
+    def _shutdown(self) -> None:
+        """Send pending notifications and save state before exiting."""
+        self.scheduler.flush_outbox()
+        self.scheduler.save_state()
+        logger.info("Scheduler state saved")
+
+    async def _booking_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                delay = await self._run_cycle()
+            except Exception as e:
+                logger.error(f"Error in booking cycle: {e}", exc_info=True)
+                logger.info("Continuing after error...")
+                delay = 60  # Wait a minute before retrying
+            if delay is not None:
+                await self._wait(delay)
+
+    async def _wait(self, seconds: float) -> None:
+        """Wait until the next cycle is due, or until woken by a signal or rules change."""
+        self.next_cycle_at = time.time() + seconds
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+        self.next_cycle_at = None
+
+    async def _run_cycle(self) -> Optional[float]:
+        """
+        Run one booking cycle.
+
+        Returns:
+            Seconds to wait before the next cycle, or None when stopping
+        """
+        async with self._cycle_lock:
+            self._cycle_started = time.monotonic()
+            try:
+                if self._reload_requested:
+                    await self._handle_reload()
+
+                self._cycle_thread = asyncio.ensure_future(
+                    asyncio.to_thread(self._cycle_work, asyncio.get_running_loop()))
+                stats = await asyncio.shield(self._cycle_thread)
+                logger.info(
+                    f"Booking cycle complete: "
+                    f"{stats['booked']} booked, "
+                    f"{stats['failed']} failed, "
+                    f"{stats['checked']} checked"
+                )
+                self.last_cycle = dict(stats, finished_at=time.time(),
+                                       duration=round(time.monotonic() - self._cycle_started, 3))
+
+                if self.scheduler.outbox:
+                    self._outbox_ready.set()
+                await asyncio.to_thread(self.scheduler.save_state)
+                notify(f"STATUS=Last cycle: {stats['booked']} booked, {stats['failed']} failed, {stats['checked']} checked")
+            finally:
+                self._cycle_started = None
+
+        if self._stop.is_set():
+            return None
+        return self.scheduler.next_cycle_delay()
+
+    def _cycle_work(self, loop: asyncio.AbstractEventLoop) -> Dict[str, int]:
+        """
+        Blocking part of a cycle: rules, schedule refresh and bookings (runs in a thread).
+
+        Everything runs in one worker thread, so a profiled cycle also
+        covers the bookings; cProfile only sees the thread that enabled it.
+        """
+        with self.profiler.cycle():
+            self.scheduler.reload_rules()
+            logger.info("Checking for bookable lessons...")
+            lessons = self.scheduler.get_upcoming_bookable_lessons()
+            stats = self._book_all(lessons, loop)
+        self._snapshot_status()
+        return stats
+
+    def _book_all(self, lessons: List[Lesson], loop: asyncio.AbstractEventLoop) -> Dict[str, int]:
+        """Book lessons in deadline order; the API client paces the requests."""
+        stats = {'checked': len(lessons), 'booked': 0, 'failed': 0}
+        for lesson in sorted(lessons, key=lambda l: l.target_ts):
+            if self._stop.is_set():
+                logger.info("Shutdown requested - skipping remaining bookings")
+                break
+            try:
+                success = self.scheduler.book_lesson(lesson)
+            except Exception as e:
+                logger.error(f"Error booking {lesson.name} at {lesson.start_time}: {e}", exc_info=True)
+                success = False
+            stats['booked' if success else 'failed'] += 1
+            if self.scheduler.outbox:
+                # Send the notification right away, not after the remaining bookings
+                loop.call_soon_threadsafe(self._outbox_ready.set)
+        return stats
+
+    async def _handle_reload(self) -> None:
+        """Flush state and pending notifications, then reload the lesson rules."""
+        self._reload_requested = False
+        notify('RELOADING=1')
+        logger.info("Reload requested - saving state and reloading lesson rules")
+        await asyncio.to_thread(self.scheduler.flush_outbox)
+        await asyncio.to_thread(self.scheduler.save_state)
+        await asyncio.to_thread(self._reload_rules, True)
+        notify('READY=1')
+
+    def _reload_rules(self, force: bool = False) -> bool:
+        """Reload the lesson rules and refresh the status snapshot (runs in a thread, under the cycle lock)."""
+        changed = self.scheduler.reload_rules(force)
+        if changed:
+            self._snapshot_status()
+        return changed
+
+    # Helper tasks
+
+    async def _watch_rules(self) -> None:
+        """Poll the lesson rules file and start a cycle right away when it changes."""
+        while True:
+            await asyncio.sleep(Config.RULES_POLL_SECONDS)
+            if self._cycle_lock.locked():
+                continue  # The cycle reloads the rules itself
+            # Hold the lock so a cycle cannot start while the targets are being rebuilt
+            async with self._cycle_lock:
+                changed = await asyncio.to_thread(self._reload_rules)
+            if changed:
+                logger.info("Lesson rules changed - re-checking schedule now")
+                self._wake.set()
+
+    async def _outbox_worker(self) -> None:
+        """Send booking notifications as soon as they are queued, off the booking path."""
+        while True:
+            await self._outbox_ready.wait()
+            self._outbox_ready.clear()
+            await asyncio.to_thread(self.scheduler.flush_outbox)
+
+    async def _watchdog(self) -> None:
+        """
+        Ping the systemd watchdog while the service is healthy.
+
+        Pings stop while a cycle has been running for longer than
+        CYCLE_STALL_SECONDS, so systemd restarts a service stuck in a call.
+        """
+        if not self._watchdog_interval:
+            return
+        while True:
+            await asyncio.sleep(self._watchdog_interval)
+            started = self._cycle_started
+            if started is not None and time.monotonic() - started > Config.CYCLE_STALL_SECONDS:
+                logger.warning(f"Booking cycle running for {time.monotonic() - started:.0f}s, withholding watchdog ping")
+                continue
+            notify('WATCHDOG=1')
+
+    # Status endpoint
+
+    def _snapshot_status(self) -> None:
+        """
+        Take the scheduler part of the status.
+
+        Called only where nothing else changes the scheduler: before the first
+        cycle, and at the end of a cycle or rules reload, in its own thread.
+        status() runs on the event loop and only reads this snapshot, never
+        the live scheduler structures.
+        """
+        scheduler = self.scheduler
+        now = time.time()
+        upcoming = [
+            lesson for lesson in scheduler.target_lessons()
+            if lesson.target_ts > now and lesson.id not in scheduler.attempted_lesson_ids
+        ]
+        next_lesson = min(upcoming, key=lambda l: l.target_ts, default=None)
+        retries = list(scheduler.full_lesson_retries.values())
+        self._scheduler_status = {
+            'next_window': {
+                'lesson': next_lesson.name,
+                'start': next_lesson.start_time.isoformat(),
+                'opens_at': next_lesson.target_booking_time.isoformat(),
+            } if next_lesson else None,
+            'cached_lessons': len(scheduler.schedule_index),
+            'targets': len(upcoming),
+            'booked': len(scheduler.booked_lesson_ids),
+            'waiting_for_spot': sum(1 for retry_info in retries if retry_info['full']),
+            'retrying_after_error': sum(1 for retry_info in retries if not retry_info['full']),
+        }
+
+    def status(self) -> Dict:
+        """Live service status as a JSON-serialisable dictionary."""
+        now = time.time()
+        return {
+            'pid': os.getpid(),
+            'started_at': datetime.fromtimestamp(self.started_at, LOCAL_TZ).isoformat(timespec='seconds'),
+            'uptime_seconds': round(now - self.started_at),
+            'dry_run': Config.DRY_RUN,
+            'cycle_running': self._cycle_started is not None,
+            'last_cycle': self.last_cycle,
+            'next_cycle_in_seconds': round(self.next_cycle_at - now) if self.next_cycle_at else None,
+            **self._scheduler_status,
+            'outbox': len(self.scheduler.outbox),
+            'decisions_recorded': self.scheduler.decisions.total,
+            'preflight': self.preflight,
+        }
+
+    def decisions(self, lesson_id: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+        """Recorded scheduling decisions, oldest first, with lesson names from the schedule cache."""
+        records = []
+        for record in self.scheduler.decisions.records(lesson_id, limit):
+            entry = describe(record)
+            entry['time'] = datetime.fromtimestamp(entry['time'], LOCAL_TZ).isoformat(timespec='seconds')
+            lesson_data = self.scheduler.schedule_index.get(entry['lesson'])
+            entry['name'] = lesson_data.get('Description') if lesson_data else None
+            records.append(entry)
+        return {'total': self.scheduler.decisions.total, 'decisions': records}
+
+    async def _start_status_server(self) -> Optional[asyncio.AbstractServer]:
+        if not Config.STATUS_PORT:
+            return None
+        try:
+            server = await asyncio.start_server(self._handle_status, '127.0.0.1', Config.STATUS_PORT)
+        except OSError as e:
+            logger.warning(f"Status endpoint disabled, cannot listen on port {Config.STATUS_PORT}: {e}")
+            return None
+        logger.info(f"Status endpoint: http://127.0.0.1:{Config.STATUS_PORT}/status")
+        return server
+
+    async def _handle_status(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer GET /status and GET /decisions[?lesson=ID&limit=N] with JSON (minimal HTTP/1.0)."""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass  # Skip headers
+            parts = request_line.decode('latin-1').split()
+            url = urlsplit(parts[1]) if len(parts) >= 2 and parts[0] == 'GET' else None
+            if url is not None and url.path in ('/', '/status', '/decisions'):
+                try:
+                    if url.path == '/decisions':
+                        query = parse_qs(url.query)
+                        limit = query.get('limit')
+                        result = self.decisions(query.get('lesson', [None])[0], int(limit[0]) if limit else None)
+                    else:
+                        result = self.status()
+                    code, body = '200 OK', json.dumps(result, indent=2)
+                except ValueError as e:
+                    code, body = '400 Bad Request', json.dumps({'error': str(e)})
+            else:
+                code, body = '404 Not Found', json.dumps({'error': 'not found'})
+            data = body.encode('utf-8')
+            writer.write(
+                f"HTTP/1.0 {code}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode('latin-1') + data
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
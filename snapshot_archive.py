@@ -0,0 +1,324 @@
+"""
+Append-only archive of fetched schedule snapshots and fill-rate analytics.
+
+Every fetched schedule is stored as one compressed, column-oriented frame of
+(lesson id, SpotsInt, MaximumParticipants, Full) plus the fetch timestamp.
+Lesson type and start time are stored once per lesson in separate catalog
+frames. The history shows when target lessons fill up, which is what the
+retry and polling settings should be tuned against.
+
+File layout: a sequence of frames, each a fixed header followed by a zlib
+compressed payload::
+
+    magic (2s) | kind (B) | timestamp (d) | count (I) | payload length (I)
+
+A frame torn by a crash is skipped when reading: the reader resyncs at the
+next frame header. Before appending, a torn frame at the end is cut off, so
+new frames always start at a frame boundary.
+"""
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from lesson import parse_lesson_time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SA'
+KIND_SNAPSHOT = 1
+KIND_CATALOG = 2
+
+_HEADER = struct.Struct('<2sBdII')
+_LENGTH = struct.Struct('<I')
+
+# Hours before lesson start used to bucket fill curves
+CURVE_BUCKETS = (168, 72, 48, 47, 36, 24, 12, 6, 2, 0)
+
+
+def _pack_strings(values: List[str]) -> bytes:
+    data = '\n'.join(value.replace('\n', ' ') for value in values).encode('utf-8')
+    return _LENGTH.pack(len(data)) + data
+
+
+def _unpack_strings(payload: bytes, offset: int, count: int) -> Tuple[List[str], int]:
+    (length,) = _LENGTH.unpack_from(payload, offset)
+    offset += _LENGTH.size
+    values = payload[offset:offset + length].decode('utf-8').split('\n') if count else []
+    return values, offset + length
+
+
+def _find_frame(buf: Union[bytes, mmap.mmap], pos: int) -> Optional[Tuple[int, int, float, int, int]]:
+    """
+    Find the next whole frame at or after ``pos``.
+
+    A frame counts as whole if its header is valid, its payload fits in the
+    file and it is followed by another header, the end of the file or a torn
+    tail too short for a header. Anything else is skipped up to the next MAGIC.
+
+    Returns:
+        (offset, kind, timestamp, count, payload length), or None if there is no further frame
+    """
+    size = len(buf)
+    while 0 <= pos and pos + _HEADER.size <= size:
+        magic, kind, timestamp, count, length = _HEADER.unpack_from(buf, pos)
+        end = pos + _HEADER.size + length
+        if (magic == MAGIC and kind in (KIND_SNAPSHOT, KIND_CATALOG) and end <= size
+                and (size - end < _HEADER.size or buf[end:end + len(MAGIC)] == MAGIC)):
+            return pos, kind, timestamp, count, length
+        pos = buf.find(MAGIC, pos + 1)
+    return None
+
+
+def _unpack_array(typecode: str, payload: bytes, offset: int, count: int) -> Tuple[array, int]:
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(payload[offset:end])
+    return values, end
+
+
+class SnapshotArchive:
+    """Append-only, compressed archive of schedule snapshots."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._catalog_ids: Optional[Set[str]] = None
+        self._end: Optional[int] = None  # End of the last whole frame, where the next one goes
+
+    def _known_ids(self) -> Set[str]:
+        """IDs that already have a catalog entry (read once, then kept in memory)."""
+        if self._catalog_ids is None:
+            self._catalog_ids = set()
+            for kind, _, columns in self.frames(kinds=(KIND_CATALOG,)):
+                self._catalog_ids.update(columns['ids'])
+        return self._catalog_ids
+
+    def recorder(self, timestamp: Optional[float] = None) -> 'SnapshotRecorder':
+        """Start recording one fetched schedule lesson by lesson (see SnapshotRecorder)."""
+        return SnapshotRecorder(self, time.time() if timestamp is None else timestamp)
+
+    def append(self, lessons: Iterable[Dict], timestamp: Optional[float] = None) -> int:
+        """
+        Append one fetched schedule.
+
+        Args:
+            lessons: Raw lesson data from the API
+            timestamp: Fetch time in epoch seconds (defaults to now)
+
+        Returns:
+            Number of lessons stored
+        """
+        recorder = self.recorder(timestamp)
+        for lesson_data in lessons:
+            recorder.add(lesson_data)
+        return recorder.commit()
+
+    @staticmethod
+    def _frame(kind: int, timestamp: float, count: int, payload: bytes) -> bytes:
+        compressed = zlib.compress(payload, 6)
+        return _HEADER.pack(MAGIC, kind, timestamp, count, len(compressed)) + compressed
+
+    def frames(self, kinds: Tuple[int, ...] = (KIND_SNAPSHOT, KIND_CATALOG)) -> Iterator[Tuple[int, float, Dict]]:
+        """
+        Iterate over archived frames in order.
+
+        Yields:
+            (kind, timestamp, columns) tuples. Snapshot columns are ids, spots,
+            max and full; catalog columns are ids, start and type.
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            pos = 0
+            while True:
+                frame = _find_frame(buf, pos)
+                if frame is None:
+                    return
+                start, kind, timestamp, count, length = frame
+                if start != pos:
+                    logger.warning(f"Skipped {start - pos} corrupt bytes at offset {pos} of {self.path}")
+                pos = start + _HEADER.size + length
+                if kind not in kinds:
+                    continue
+                try:
+                    columns = self._decode(kind, count, zlib.decompress(buf[start + _HEADER.size:pos]))
+                except (zlib.error, struct.error, UnicodeDecodeError) as e:
+                    logger.warning(f"Corrupt frame at offset {start} of {self.path}, skipping it: {e}")
+                    pos = start + 1
+                    continue
+                yield kind, timestamp, columns
+
+    def _append(self, data: bytes) -> None:
+        """Append whole frames, first cutting off a frame torn by a crash."""
+        with open(self.path, 'ab') as f:
+            if self._end is None:
+                self._end = self._valid_end()
+            if f.tell() != self._end:
+                logger.warning(f"Removing {f.tell() - self._end} bytes of a torn frame from {self.path}")
+                f.truncate(self._end)
+                f.seek(self._end)
+            # One write per fetch keeps frames whole even if the process is killed
+            f.write(data)
+        self._end += len(data)
+
+    def _valid_end(self) -> int:
+        """Offset just past the last whole frame in the archive file."""
+        if os.path.getsize(self.path) == 0:
+            return 0
+        end = 0
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            frame = _find_frame(buf, 0)
+            while frame is not None:
+                start, _, _, _, length = frame
+                end = start + _HEADER.size + length
+                frame = _find_frame(buf, end)
+        return end
+
+    @staticmethod
+    def _decode(kind: int, count: int, payload: bytes) -> Dict:
+        ids, offset = _unpack_strings(payload, 0, count)
+        if kind == KIND_CATALOG:
+            starts, offset = _unpack_array('d', payload, offset, count)
+            types, _ = _unpack_strings(payload, offset, count)
+            return {'ids': ids, 'start': starts, 'type': types}
+        spots, offset = _unpack_array('i', payload, offset, count)
+        maximum, offset = _unpack_array('i', payload, offset, count)
+        full = payload[offset:offset + count]
+        return {'ids': ids, 'spots': spots, 'max': maximum, 'full': full}
+
+
+class SnapshotRecorder:
+    """
+    Collects the columns of one snapshot while a schedule is streamed.
+
+    Only the archived fields are kept per lesson, so the raw lesson data can
+    be dropped as soon as it has been added. Nothing is written until commit().
+    """
+
+    def __init__(self, archive: SnapshotArchive, timestamp: float):
+        self.archive = archive
+        self.timestamp = timestamp
+        self._known = archive._known_ids()
+        self.ids: List[str] = []
+        self.spots = array('i')
+        self.maximum = array('i')
+        self.full = bytearray()
+        self.new_ids: List[str] = []
+        self.new_starts = array('d')
+        self.new_types: List[str] = []
+
+    def add(self, lesson_data: Dict) -> None:
+        """Record one raw lesson."""
+        lesson_id = str(lesson_data.get('_id'))
+        self.ids.append(lesson_id)
+        self.spots.append(int(lesson_data.get('SpotsInt') or 0))
+        self.maximum.append(int(lesson_data.get('MaximumParticipants') or 0))
+        self.full.append(1 if lesson_data.get('Full') else 0)
+
+        if lesson_id not in self._known:
+            try:
+                start_ts = parse_lesson_time(lesson_data).timestamp()
+            except (TypeError, ValueError):
+                return
+            self.new_ids.append(lesson_id)
+            self.new_starts.append(start_ts)
+            self.new_types.append(lesson_data.get('Description', ''))
+
+    def commit(self) -> int:
+        """
+        Write the recorded snapshot to the archive.
+
+        Returns:
+            Number of lessons stored
+        """
+        if not self.ids:
+            return 0
+
+        frames = []
+        if self.new_ids:
+            frames.append(self.archive._frame(
+                KIND_CATALOG, self.timestamp, len(self.new_ids),
+                _pack_strings(self.new_ids) + self.new_starts.tobytes() + _pack_strings(self.new_types)))
+        frames.append(self.archive._frame(
+            KIND_SNAPSHOT, self.timestamp, len(self.ids),
+            _pack_strings(self.ids) + self.spots.tobytes() + self.maximum.tobytes() + bytes(self.full)))
+
+        self.archive._append(b''.join(frames))
+        self._known.update(self.new_ids)
+        return len(self.ids)
+
+
+def _bucket(hours_before: float) -> Optional[int]:
+    """Largest bucket edge not above hours_before, or None if outside the curve."""
+    for edge in CURVE_BUCKETS:
+        if hours_before >= edge:
+            return edge if hours_before <= CURVE_BUCKETS[0] else None
+    return None
+
+
+def fill_report(archive: SnapshotArchive, lesson_types: Optional[Set[str]] = None) -> Dict[str, Dict]:
+    """
+    Compute fill curves per lesson type from the archive.
+
+    Args:
+        archive: Archive to read
+        lesson_types: Only report these types (all types if None)
+
+    Returns:
+        Dictionary per lesson type with:
+            lessons: number of distinct lessons seen
+            filled: number of those lessons that were ever full
+            first_full_hours: hours before start at which each filled lesson was first seen full
+            curve: {bucket hours: (mean fill ratio, share of snapshots full, samples)}
+    """
+    catalog: Dict[str, Tuple[float, str]] = {}
+    sums: Dict[str, Dict[int, List[float]]] = {}
+    seen: Dict[str, Set[str]] = {}
+    first_full: Dict[str, float] = {}
+
+    for kind, timestamp, columns in archive.frames():
+        if kind == KIND_CATALOG:
+            for lesson_id, start, lesson_type in zip(columns['ids'], columns['start'], columns['type']):
+                catalog[lesson_id] = (start, lesson_type)
+            continue
+
+        for lesson_id, spots, maximum, full in zip(columns['ids'], columns['spots'], columns['max'], columns['full']):
+            info = catalog.get(lesson_id)
+            if info is None or maximum <= 0:
+                continue
+            start, lesson_type = info
+            if lesson_types is not None and lesson_type not in lesson_types:
+                continue
+            hours_before = (start - timestamp) / 3600
+            bucket = _bucket(hours_before)
+            if bucket is None:
+                continue
+
+            seen.setdefault(lesson_type, set()).add(lesson_id)
+            is_full = bool(full) or spots >= maximum
+            if is_full and lesson_id not in first_full:
+                first_full[lesson_id] = hours_before
+
+            stats = sums.setdefault(lesson_type, {}).setdefault(bucket, [0.0, 0, 0])
+            stats[0] += spots / maximum
+            stats[1] += 1 if is_full else 0
+            stats[2] += 1
+
+    report = {}
+    for lesson_type, buckets in sums.items():
+        lesson_ids = seen[lesson_type]
+        full_hours = sorted(first_full[i] for i in lesson_ids if i in first_full)
+        report[lesson_type] = {
+            'lessons': len(lesson_ids),
+            'filled': len(full_hours),
+            'first_full_hours': full_hours,
+            'curve': {
+                bucket: (total / samples, full_count / samples, samples)
+                for bucket, (total, full_count, samples) in sorted(buckets.items(), reverse=True)
+            },
+        }
+    return report
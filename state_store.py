@@ -0,0 +1,51 @@
+"""
+Persistent scheduler state.
+
+The scheduler saves its session state (booked and attempted lessons, full
+lesson retries) and the last fetched schedule to a JSON file after every
+cycle. A restarted daemon picks up where it left off, and offline commands
+such as ``python main.py query`` answer from the file without API calls.
+"""
+import json
+import logging
+import time
+from typing import Dict
+
+from fileutil import atomic_write
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+
+class StateStore:
+    """Loads and atomically saves the scheduler state file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict:
+        """
+        Load the saved state.
+
+        Returns:
+            State dictionary, empty if there is no (valid) state file
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable state file {self.path}: {e}")
+            return {}
+
+        if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+            logger.warning(f"Ignoring state file {self.path} with unknown version")
+            return {}
+        return state
+
+    def save(self, state: Dict) -> None:
+        """Write the state to a temporary file and rename it over the old one."""
+        state = dict(state, version=STATE_VERSION, saved_at=time.time())
+        atomic_write(self.path, json.dumps(state, separators=(',', ':')).encode('utf-8'), mode=0o600)
@@ -51,12 +51,12 @@ else
     echo "To start: ./run-background.sh"
     echo ""
     
-    # Check if process is running without PID file
-    if pgrep -f "python3 main.py" > /dev/null; then
-        echo "⚠️  Warning: Found orphaned process:"
-        ps aux | grep "python3 main.py" | grep -v grep
+    # An instance without PID file (e.g. the systemd unit) still holds the lock
+    if python3 main.py status --lines 0 2>/dev/null | grep -q "^Service:  RUNNING"; then
+        echo "⚠️  Warning: Another instance holds the lock:"
+        python3 main.py status --lines 0 | head -1
         echo ""
-        echo "To kill: pkill -f 'python3 main.py'"
+        echo "Is it the systemd unit? sudo systemctl status sportivity-booking"
     fi
 fi
 
@@ -22,7 +22,12 @@ PID=$(cat sportivity.pid)
 if ps -p $PID > /dev/null 2>&1; then
     echo "Stopping service (PID: $PID)..."
     kill $PID
-    sleep 2
+    
+    # Give the service time to save its state and send pending emails
+    for i in $(seq 1 30); do
+        ps -p $PID > /dev/null 2>&1 || break
+        sleep 1
+    done
     
     # Check if still running
     if ps -p $PID > /dev/null 2>&1; then
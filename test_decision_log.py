@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test script for the scheduling decision audit log (no API access needed).
+"""
+import logging
+import sys
+
+from decision_log import (
+    ACTION_BOOKED, ACTION_SKIP, ACTION_TARGET, ACTION_WAIT,
+    RULE_BOOKING, RULE_BOOKING_STATUS, RULE_SLOT, RULE_TYPE, RULE_WINDOW,
+    DecisionLog, describe,
+)
+from lesson_rules import LessonRules
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def test_ring_buffer():
+    """The buffer keeps the newest records in order and can be filtered by lesson."""
+    log = DecisionLog(size=3)
+    for i in range(5):
+        log.record(str(i % 2), RULE_WINDOW, ACTION_WAIT)
+    assert log.total == 5 and len(log) == 3
+    assert [record[1] for record in log.records()] == ['0', '1', '0']
+    assert [record[1] for record in log.records(limit=2)] == ['1', '0']
+    assert len(log.records(lesson_id='0')) == 2
+    assert log.records(limit=0) == []
+
+    entry = describe(log.records()[-1])
+    assert entry['rule'] == 'window' and entry['action'] == 'wait'
+
+
+def test_record_change():
+    """Repeated decisions are only recorded when they change."""
+    log = DecisionLog(size=10)
+    assert log.record_change('1', RULE_WINDOW, ACTION_WAIT)
+    assert not log.record_change('1', RULE_WINDOW, ACTION_WAIT)
+    log.record('1', RULE_BOOKING, ACTION_BOOKED)
+    assert log.record_change('1', RULE_WINDOW, ACTION_WAIT)
+    assert log.total == 3
+
+
+def test_rules_check_codes():
+    """LessonRules.check() names the rule that decided."""
+    rules = LessonRules.from_dict({'lessons': [{'type': 'Pilates', 'day': 'tuesday', 'time': '20:00'}]})
+    lesson = {'_id': 1, 'Description': 'Pilates',
+              'LessonStartTime': '2025-11-04T20:00:00', 'LessonEndTime': '2025-11-04T21:00:00'}
+
+    assert rules.check(lesson)[1] == RULE_SLOT and rules.check(lesson)[0] is not None
+    assert rules.check(dict(lesson, BookingStatus='Gereserveerd')) == (None, RULE_BOOKING_STATUS)
+    assert rules.check(dict(lesson, Description='Yoga')) == (None, RULE_TYPE)
+    assert rules.check(dict(lesson, LessonStartTime='2025-11-04T19:00:00')) == (None, RULE_SLOT)
+
+    log = DecisionLog()
+    log.record('1', RULE_SLOT, ACTION_TARGET)
+    log.record('2', RULE_TYPE, ACTION_SKIP)
+    assert [describe(r)['action'] for r in log.records()] == ['target', 'skip']
+
+
+if __name__ == "__main__":
+    try:
+        test_ring_buffer()
+        test_record_change()
+        test_rules_check_codes()
+        logger.info("All decision log tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
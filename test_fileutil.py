@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script for atomic writes and the single-instance lock (no API access needed).
+"""
+import json
+import logging
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import fileutil
+from fileutil import InstanceLock, LockError, atomic_write
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def test_atomic_write():
+    """The file is replaced in one step with the requested permissions."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'token.enc')
+        atomic_write(path, b'first', mode=0o600)
+        atomic_write(path, b'second', mode=0o600)
+        with open(path, 'rb') as f:
+            assert f.read() == b'second'
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        assert os.listdir(tmp) == ['token.enc']
+
+
+def test_instance_lock():
+    """A second lock on the same file is refused and names the holder."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sportivity.lock')
+        assert InstanceLock(path).holder() is None
+
+        with InstanceLock(path):
+            holder = InstanceLock(path).holder()
+            assert holder['pid'] == os.getpid()
+            try:
+                InstanceLock(path).acquire()
+            except LockError as e:
+                assert e.holder['pid'] == os.getpid()
+                assert str(os.getpid()) in str(e)
+            else:
+                raise AssertionError("Second instance got the lock")
+
+        # Released on exit, so the next instance can start
+        with InstanceLock(path):
+            pass
+        assert InstanceLock(path).holder() is None
+
+
+def test_holder_does_not_take_lock():
+    """Asking for the holder never blocks an instance that is starting; a dead holder is ignored."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sportivity.lock')
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'pid': dead.pid, 'host': socket.gethostname()}, f)
+
+        # holder() must not flock the file: a starting instance would fail to get the lock
+        flocked = []
+        real_fcntl = fileutil.fcntl
+        fileutil.fcntl = SimpleNamespace(**vars(real_fcntl))
+        fileutil.fcntl.flock = lambda fd, operation: flocked.append(operation)
+        try:
+            assert InstanceLock(path).holder() is None
+        finally:
+            fileutil.fcntl = real_fcntl
+        assert flocked == []
+
+        with InstanceLock(path):
+            assert InstanceLock(path).holder()['pid'] == os.getpid()
+
+
+if __name__ == "__main__":
+    try:
+        test_atomic_write()
+        test_instance_lock()
+        test_holder_does_not_take_lock()
+        logger.info("All file utility tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for incremental JSON decoding of schedule responses (no API access needed).
+"""
+import json
+import logging
+import sys
+
+from json_stream import iter_array
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+LESSONS = [
+    {'_id': 1, 'Description': 'Yoga', 'SpotsInt': 12, 'Trainer': 'Renée'},
+    {'_id': 2, 'Description': 'BBB (Billen, Buik, Benen)', 'SpotsInt': 20, 'Full': True},
+    12345,
+    None,
+]
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_stream_any_chunk_size():
+    """Elements decode correctly whatever the chunk boundaries (also inside numbers and UTF-8)."""
+    body = json.dumps({'Response': {'Code': 0}, 'LessonDefinitions': LESSONS, 'Tail': [1, 2]},
+                      ensure_ascii=False).encode('utf-8')
+    for size in range(1, 40):
+        assert list(iter_array(_chunks(body, size), 'LessonDefinitions')) == LESSONS, size
+    assert list(iter_array([body.decode('utf-8')], 'LessonDefinitions')) == LESSONS
+
+
+def test_stream_missing_or_empty():
+    """A missing, null or empty array yields nothing."""
+    assert list(iter_array([b'{"Response": "OK"}'], 'LessonDefinitions')) == []
+    assert list(iter_array([b'{}'], 'LessonDefinitions')) == []
+    assert list(iter_array([b'{"LessonDefinitions": null}'], 'LessonDefinitions')) == []
+    assert list(iter_array([b' { "LessonDefinitions" : [ ] } '], 'LessonDefinitions')) == []
+
+
+def test_stream_truncated():
+    """A response cut off inside the array raises ValueError after the complete elements."""
+    body = json.dumps({'LessonDefinitions': LESSONS}).encode('utf-8')
+    received = []
+    try:
+        for item in iter_array(_chunks(body[:body.index(b'12345') + 3], 7), 'LessonDefinitions'):
+            received.append(item)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Truncated response was accepted")
+    assert received == LESSONS[:2]
+
+    for bad in (b'[]', b'{"LessonDefinitions": [1 2]}', b''):
+        try:
+            list(iter_array([bad], 'LessonDefinitions'))
+        except ValueError:
+            continue
+        raise AssertionError(f"Invalid response {bad!r} was accepted")
+
+
+if __name__ == "__main__":
+    try:
+        test_stream_any_chunk_size()
+        test_stream_missing_or_empty()
+        test_stream_truncated()
+        logger.info("All JSON stream tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for timezone-aware lesson times and booking deadlines (no API access needed).
+"""
+import logging
+import os
+import sys
+from datetime import datetime
+
+os.environ['TIMEZONE'] = 'Europe/Amsterdam'
+
+from lesson import Lesson, parse_lesson
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _lesson_data(start: str, end: str) -> dict:
+    return {
+        '_id': 1,
+        'Description': 'Pilates',
+        'LessonStartTime': start,
+        'LessonEndTime': end,
+        'MaximumParticipants': 20,
+        'SpotsInt': 5,
+    }
+
+
+def test_lesson_date_in_utc():
+    """The booking timestamp is the local start converted to UTC, winter and summer."""
+    winter = parse_lesson(_lesson_data('2025-11-03T19:00:00', '2025-11-03T20:00:00'))
+    assert winter.lesson_date_iso == '2025-11-03T18:00:00.000Z'
+    assert winter.start_hhmm == '19:00' and winter.duration_minutes == 60
+
+    summer = parse_lesson(_lesson_data('2025-07-01T19:00:00', '2025-07-01T20:00:00'))
+    assert summer.lesson_date_iso == '2025-07-01T17:00:00.000Z'
+
+
+def test_deadlines_across_dst():
+    """A window spanning the spring DST change opens exactly 48 real hours before the lesson."""
+    # DST starts Sunday 2025-03-30; the lesson is Monday 09:30 CEST
+    lesson = parse_lesson(_lesson_data('2025-03-31T09:30:00', '2025-03-31T10:30:00'))
+    assert lesson.start_ts - lesson.opens_ts == 48 * 3600
+    # 48h before 09:30 CEST is 08:30 CET on Saturday
+    assert lesson.booking_opens_at.strftime('%a %H:%M') == 'Sat 08:30'
+    assert lesson.is_bookable_now(lesson.opens_ts)
+    assert not lesson.is_bookable_now(lesson.opens_ts - 1)
+
+
+def test_utc_fallback():
+    """Only UTC fields: times are converted to local time, so rule matching still sees 19:00."""
+    lesson = parse_lesson({
+        '_id': 2,
+        'Description': 'Pilates',
+        'UTCStartTime': '2025-11-03T18:00:00Z',
+        'UTCEndTime': '2025-11-03T19:00:00',
+    })
+    assert lesson.start_hhmm == '19:00' and lesson.weekday == 0
+    assert lesson.duration_minutes == 60
+    assert lesson.lesson_date_iso == '2025-11-03T18:00:00.000Z'
+
+
+def test_naive_start_is_local():
+    """A naive start time is taken as local and equals the parsed lesson."""
+    parsed = parse_lesson(_lesson_data('2025-11-03T19:00:00', '2025-11-03T20:00:00'))
+    built = Lesson(
+        id='1', name='Pilates', lesson_type='Pilates',
+        start_time=datetime(2025, 11, 3, 19, 0), duration_minutes=60,
+        available_spots=15,
+    )
+    assert built.start_time.tzinfo is not None
+    assert built == parsed
+    assert built.target_ts == parsed.target_ts
+
+
+if __name__ == "__main__":
+    tests = [test_lesson_date_in_utc, test_deadlines_across_dst, test_utc_fallback, test_naive_start_is_local]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            logger.info(f"✅ {test.__name__} passed")
+        except AssertionError as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e}")
+    sys.exit(1 if failed else 0)
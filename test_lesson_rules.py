@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for lesson rules validation and hot reloading (no API access needed).
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from config import Config
+from lesson_rules import LessonRules, RulesError, RulesWatcher
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def test_rules_matching():
+    """Rules match on type (or alias), weekday and start time."""
+    rules = LessonRules.from_dict({'lessons': [
+        {'type': 'BBB (billen, buik, benen)', 'aliases': ['BBB (Billen, Buik, Benen)'],
+         'day': 'tuesday', 'time': '19:00'},
+        {'type': 'Pilates', 'day': 2, 'time': '10:30'},
+    ]})
+    assert rules.matches('BBB (Billen, Buik, Benen)', 1, '19:00')
+    assert rules.matches('Pilates', 2, '10:30')
+    assert not rules.matches('Pilates', 1, '19:00')
+    assert not rules.matches('Pilates', 2, '10:00')
+    assert 'BBB (billen, buik, benen)' in rules.types
+
+
+def test_location_rules():
+    """Each location has its own lessons; a plain 'lessons' list uses the default location."""
+    rules = LessonRules.from_dict({'locations': [
+        {'id': '100', 'name': 'Club A', 'lessons': [{'type': 'Yoga', 'day': 'friday', 'time': '10:30'}]},
+        {'id': 200, 'name': 'Club B', 'refresh_minutes': 120,
+         'lessons': [{'type': 'Pilates', 'day': 'friday', 'time': '10:30'}]},
+    ]})
+    assert rules.matches('Yoga', 4, '10:30', '100')
+    assert not rules.matches('Yoga', 4, '10:30', '200')
+    assert rules.matches('Pilates', 4, '10:30', '200')
+    assert not rules.matches('Pilates', 4, '10:30', '300')
+    assert rules.for_location('200').refresh_minutes == 120
+    assert rules.types == {'Yoga', 'Pilates'}
+
+    single = LessonRules.from_dict({'lessons': [{'type': 'Yoga', 'day': 4, 'time': '10:30'}]})
+    assert single.default_location == Config.LOCATION_ID
+    assert single.matches('Yoga', 4, '10:30', Config.LOCATION_ID)
+
+
+def test_rules_validation():
+    """Invalid rules are rejected with a descriptive error."""
+    invalid = [
+        {},
+        {'lessons': [{'type': '', 'day': 1, 'time': '19:00'}]},
+        {'lessons': [{'type': 'Yoga', 'day': 'someday', 'time': '19:00'}]},
+        {'lessons': [{'type': 'Yoga', 'day': 7, 'time': '19:00'}]},
+        {'lessons': [{'type': 'Yoga', 'day': 1, 'time': '25:00'}]},
+        {'lessons': [{'type': 'Yoga', 'day': 1, 'time': '19:00', 'tyme': '20:00'}]},
+        {'locations': []},
+        {'locations': [{'id': '1', 'lessons': []}, {'id': 1, 'lessons': []}]},
+        {'locations': [{'id': '1', 'refresh_minutes': 0, 'lessons': []}]},
+    ]
+    for data in invalid:
+        try:
+            LessonRules.from_dict(data)
+        except RulesError as e:
+            logger.info(f"Rejected as expected: {e}")
+        else:
+            raise AssertionError(f"Rules should have been rejected: {data}")
+
+
+def test_rules_reload():
+    """The watcher reloads changed files and keeps old rules on invalid ones."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'lessons.json')
+        with open(path, 'w') as f:
+            json.dump({'lessons': [{'type': 'Yoga', 'day': 'friday', 'time': '10:30'}]}, f)
+
+        watcher = RulesWatcher(path)
+        assert not watcher.poll()
+        assert watcher.rules.matches('Yoga', 4, '10:30')
+
+        with open(path, 'w') as f:
+            json.dump({'lessons': [{'type': 'Pilates', 'day': 'friday', 'time': '10:30'}]}, f)
+        os.utime(path, ns=(0, 1))
+        assert watcher.poll()
+        assert watcher.rules.matches('Pilates', 4, '10:30')
+
+        with open(path, 'w') as f:
+            f.write('{ not json')
+        os.utime(path, ns=(0, 2))
+        assert not watcher.poll()
+        assert watcher.rules.matches('Pilates', 4, '10:30')
+
+
+if __name__ == "__main__":
+    try:
+        test_rules_matching()
+        test_location_rules()
+        test_rules_validation()
+        test_rules_reload()
+        logger.info("All lesson rules tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
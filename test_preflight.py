@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for the startup preflight checks (no API access needed).
+"""
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from config import Config
+from preflight import check_paths, run_preflight
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _sleep(seconds: float, detail: str = "done"):
+    def check(scheduler):
+        time.sleep(seconds)
+        return detail
+    return check
+
+
+def _fail(scheduler):
+    raise ConnectionError("backend unreachable")
+
+
+def test_parallel_and_timeouts():
+    """Checks run in parallel; slow or failing checks are reported without blocking the rest."""
+    start = time.monotonic()
+    report = run_preflight(None, [
+        ('one', _sleep(0.2), True),
+        ('two', _sleep(0.2), True),
+        ('slow', _sleep(2), True),
+        ('smtp', _fail, False),
+    ], timeout=0.5)
+    assert time.monotonic() - start < 1.0
+
+    results = {result.name: result for result in report.results}
+    assert results['one'].ok and results['two'].ok and results['one'].detail == "done"
+    assert not results['slow'].ok and 'timed out' in results['slow'].detail
+    assert not results['smtp'].ok and 'ConnectionError' in results['smtp'].detail
+    assert not report.ready
+
+    lines = report.lines()
+    assert lines[2].split()[:2] == ['slow', 'FAIL'] and lines[3].split()[:2] == ['smtp', 'WARN']
+    assert report.as_dict()['checks']['one']['ok'] is True
+
+
+def test_optional_failure_is_ready():
+    """A failing optional check does not block startup."""
+    report = run_preflight(None, [('api', _sleep(0), True), ('smtp', _fail, False)], timeout=1)
+    assert report.ready
+
+
+def test_stuck_check_does_not_block_exit():
+    """The process can exit while a timed-out check is still running."""
+    script = (
+        "import time\n"
+        "from preflight import run_preflight\n"
+        "report = run_preflight(None, [('auth', lambda scheduler: time.sleep(30), True)], timeout=0.2)\n"
+        "assert not report.ready\n"
+    )
+    start = time.monotonic()
+    subprocess.run([sys.executable, '-c', script], check=True, timeout=20,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert time.monotonic() - start < 10
+
+
+def test_check_paths():
+    """The state directories must be writable."""
+    old = Config.STATE_FILE, Config.TOKEN_FILE, Config.LOCK_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            Config.STATE_FILE = os.path.join(tmp, 'state.json')
+            Config.TOKEN_FILE = os.path.join(tmp, 'token.enc')
+            Config.LOCK_FILE = os.path.join(tmp, 'sportivity.lock')
+            check_paths()
+            assert os.listdir(tmp) == []
+
+            Config.STATE_FILE = os.path.join(tmp, 'missing', 'state.json')
+            try:
+                check_paths()
+                assert False, "missing directory should fail"
+            except OSError:
+                pass
+        finally:
+            Config.STATE_FILE, Config.TOKEN_FILE, Config.LOCK_FILE = old
+
+
+if __name__ == "__main__":
+    try:
+        test_parallel_and_timeouts()
+        test_optional_failure_is_ready()
+        test_stuck_check_does_not_block_exit()
+        test_check_paths()
+        logger.info("All preflight tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
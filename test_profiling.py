@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for on-demand profiling (no API access needed).
+"""
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+from profiling import Profiler
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Worker:
+    def work(self, n: int) -> int:
+        return sum(range(n))
+
+
+def test_profile_cycles():
+    """Only requested cycles are profiled, each into a .prof and .txt file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler = Profiler(tmp)
+        with profiler.cycle():
+            pass
+        assert os.listdir(tmp) == []
+
+        profiler.request_cycles(2)
+        for _ in range(3):
+            with profiler.cycle():
+                sum(range(1000))
+        files = sorted(os.listdir(tmp))
+        assert len(files) == 4
+        assert [name.rsplit('.', 1)[1] for name in files] == ['prof', 'txt', 'prof', 'txt']
+
+
+def test_profile_function():
+    """An attached method is profiled for the requested number of calls, then unwrapped."""
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler = Profiler(tmp)
+        worker = _Worker()
+        profiler.attach(worker, 'work', calls=2)
+        assert 'work' in worker.__dict__
+
+        assert [worker.work(10) for _ in range(3)] == [45, 45, 45]
+        assert 'work' not in worker.__dict__
+        assert len([name for name in os.listdir(tmp) if name.endswith('-work.prof')]) == 2
+
+        try:
+            profiler.attach(worker, 'missing')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("attach() accepted an unknown method")
+
+        # A method that is never called while running would silently never be profiled
+        try:
+            profiler.attach(worker, 'work', allowed=('other',))
+        except ValueError as e:
+            assert 'other' in str(e)
+        else:
+            raise AssertionError("attach() accepted a method outside the allowed ones")
+        assert 'work' not in worker.__dict__
+
+
+def test_profile_function_in_other_thread():
+    """A call in another thread than a profiled cycle is not taken as covered by that cycle."""
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler = Profiler(tmp)
+        worker = _Worker()
+        profiler.attach(worker, 'work')
+        profiler.request_cycles(1)
+        with profiler.cycle():
+            thread = threading.Thread(target=worker.work, args=(10,))
+            thread.start()
+            thread.join()
+        # The call could not be profiled while the cycle was, so the method stays wrapped
+        assert 'work' in worker.__dict__
+        worker.work(10)
+        assert 'work' not in worker.__dict__
+        assert len([name for name in os.listdir(tmp) if name.endswith('-work.prof')]) == 1
+
+
+if __name__ == "__main__":
+    try:
+        test_profile_cycles()
+        test_profile_function()
+        test_profile_function_in_other_thread()
+        logger.info("All profiling tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
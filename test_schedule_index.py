@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test script for incremental schedule diffing (no API access needed).
+"""
+import logging
+import sys
+
+from schedule_index import ScheduleIndex
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _lesson(lesson_id: int, spots: int = 0, status=None, day: str = '2025-11-04') -> dict:
+    return {
+        '_id': lesson_id,
+        'Description': 'Pilates',
+        'LessonStartTime': f'{day}T20:00:00',
+        'LessonEndTime': f'{day}T21:00:00',
+        'MaximumParticipants': 20,
+        'SpotsInt': spots,
+        'BookingStatus': status,
+    }
+
+
+def test_schedule_delta():
+    """Only added, changed and removed lessons are reported."""
+    index = ScheduleIndex()
+
+    delta = index.ingest([_lesson(1), _lesson(2), _lesson(3)])
+    assert len(delta.added) == 3 and not delta.changed and not delta.removed
+
+    delta = index.ingest([_lesson(1), _lesson(2), _lesson(3)])
+    assert not delta
+
+    delta = index.ingest([_lesson(1), _lesson(2, spots=20), _lesson(4)])
+    assert [l['_id'] for l in delta.added] == [4]
+    assert [l['_id'] for l in delta.changed] == [2]
+    assert delta.removed == ['3']
+    assert '3' not in index and '4' in index
+
+    delta = index.ingest([_lesson(1, status='Gereserveerd'), _lesson(2, spots=20), _lesson(4)])
+    assert [l['_id'] for l in delta.changed] == [1]
+
+
+def test_partial_merge():
+    """A fetch for a date range only removes lessons inside that range."""
+    index = ScheduleIndex()
+    index.ingest([_lesson(1, day='2025-11-04'), _lesson(2, day='2025-11-05'), _lesson(3, day='2025-11-07')])
+
+    delta = index.ingest([_lesson(2, spots=5, day='2025-11-05')], days=('2025-11-05', '2025-11-06'))
+    assert [l['_id'] for l in delta.changed] == [2]
+    assert not delta.added and not delta.removed
+    assert len(index) == 3
+
+    delta = index.ingest([], days=('2025-11-07', '2025-11-07'))
+    assert delta.removed == ['3']
+    assert '1' in index and '2' in index
+
+
+def test_location_merge():
+    """A fetch for one location never removes another location's lessons."""
+    index = ScheduleIndex()
+    index.ingest([_lesson(1), _lesson(2)], location='A')
+    index.ingest([_lesson(2), _lesson(3)], location='B')
+    assert len(index) == 3
+    assert index.location_of('2') == 'A'
+
+    delta = index.ingest([_lesson(2)], days=('2025-11-04', '2025-11-04'), location='A')
+    assert delta.removed == ['1']
+    assert '2' in index and '3' in index
+
+
+if __name__ == "__main__":
+    try:
+        test_schedule_delta()
+        test_partial_merge()
+        test_location_merge()
+        logger.info("All schedule index tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
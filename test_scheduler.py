@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Test script for booking cycle planning with a fake API client (no API access needed).
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from config import Config
+from lesson import LOCAL_TZ
+from lesson_rules import WEEKDAYS
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _API:
+    """API client stand-in serving a fixed schedule per location."""
+
+    def __init__(self, schedules):
+        self.schedules = schedules  # location ID -> list of raw lessons
+        self.fetches = []
+        self.posts = []
+        self.book_result = True
+
+    def iter_schedule(self, start_date=None, end_date=None, location_id=None):
+        self.fetches.append((location_id, start_date.date(), end_date.date()))
+        for lesson_data in self.schedules.get(location_id, []):
+            day = lesson_data['LessonStartTime'][:10]
+            if start_date.date().isoformat() <= day <= end_date.date().isoformat():
+                yield dict(lesson_data)
+
+    def get_lesson_by_id(self, lesson_id):
+        for lessons in self.schedules.values():
+            for lesson_data in lessons:
+                if str(lesson_data['_id']) == lesson_id:
+                    return dict(lesson_data)
+        return None
+
+    def book_lesson(self, lesson_id, lesson_date_iso):
+        self.posts.append(lesson_id)
+        return self.book_result
+
+
+def _raw_lesson(lesson_id, start: datetime, spots_taken: int = 5, description: str = 'Pilates') -> dict:
+    return {
+        '_id': lesson_id,
+        'Description': description,
+        'LessonStartTime': start.strftime('%Y-%m-%dT%H:%M:%S'),
+        'LessonEndTime': (start + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%S'),
+        'MaximumParticipants': 20,
+        'SpotsInt': spots_taken,
+        'Full': spots_taken >= 20,
+    }
+
+
+def _rule(start: datetime, description: str = 'Pilates') -> dict:
+    return {'type': description, 'day': WEEKDAYS[start.weekday()], 'time': start.strftime('%H:%M')}
+
+
+def _start_in(seconds: float) -> datetime:
+    """Local lesson start time, whole minutes, about `seconds` from now."""
+    return (datetime.now(LOCAL_TZ) + timedelta(seconds=seconds)).replace(second=0, microsecond=0)
+
+
+@contextmanager
+def _scheduler(rules: dict, schedules: dict):
+    """BookingScheduler on temporary files with a fake API client."""
+    names = ('LESSON_RULES_FILE', 'STATE_FILE', 'ENABLE_ARCHIVE', 'ENABLE_EMAIL', 'TOKEN_FILE', 'TOKEN_KEY_FILE')
+    old = {name: getattr(Config, name) for name in names}
+    with tempfile.TemporaryDirectory() as tmp:
+        rules_file = os.path.join(tmp, 'lessons.json')
+        with open(rules_file, 'w', encoding='utf-8') as f:
+            json.dump(rules, f)
+        Config.LESSON_RULES_FILE = rules_file
+        Config.STATE_FILE = os.path.join(tmp, 'state.json')
+        Config.TOKEN_FILE = os.path.join(tmp, 'token.enc')
+        Config.TOKEN_KEY_FILE = os.path.join(tmp, '.token_key')
+        Config.ENABLE_ARCHIVE = False
+        Config.ENABLE_EMAIL = False
+        try:
+            from scheduler import BookingScheduler
+            scheduler = BookingScheduler()
+            scheduler.api_client = _API(schedules)
+            yield scheduler
+        finally:
+            for name, value in old.items():
+                setattr(Config, name, value)
+
+
+def test_no_busy_loop_before_window_opens():
+    """Between the target time and the opening the scheduler waits for the opening, not 1 second."""
+    # Target time (5 min before opening) passed 3 minutes ago; the window opens in 2 minutes
+    start = _start_in(Config.BOOKING_WINDOW_HOURS * 3600 + 150)
+    with _scheduler({'lessons': [_rule(start)]}, {Config.LOCATION_ID: [_raw_lesson(1, start)]}) as scheduler:
+        delays = []
+        for _ in range(3):
+            assert scheduler.get_upcoming_bookable_lessons() == []
+            delays.append(scheduler.next_cycle_delay())
+        lesson = scheduler.target_lessons()[0]
+        assert all(abs(delay - (lesson.opens_ts - time.time())) < 5 for delay in delays), delays
+        assert all(delay > 60 for delay in delays), delays
+
+
+def test_full_refresh_while_deadlines_are_hot():
+    """A due full refresh still runs while a lesson's window is open, so new lessons are found."""
+    hot = _start_in(Config.BOOKING_WINDOW_HOURS * 3600 - 1800)  # Window opened 30 minutes ago
+    later = _start_in(5 * 24 * 3600)
+    schedule = [_raw_lesson(1, hot)]
+    rules = {'lessons': [_rule(hot), _rule(later, 'Yoga')]}
+    with _scheduler(rules, {Config.LOCATION_ID: schedule}) as scheduler:
+        scheduler.refresh_schedule()
+        assert [lesson.id for lesson in scheduler.target_lessons()] == ['1']
+
+        # A lesson is added 5 days out and the full refresh is overdue
+        schedule.append(_raw_lesson(2, later, description='Yoga'))
+        scheduler._last_full_refresh[Config.LOCATION_ID] -= 2 * 3600
+        plan = scheduler.plan_schedule_fetch()
+        assert [full for _, _, _, full in plan] == [True], plan
+        scheduler.refresh_schedule()
+        assert sorted(lesson.id for lesson in scheduler.target_lessons()) == ['1', '2']
+
+        # In between full refreshes only the hot day is fetched
+        plan = scheduler.plan_schedule_fetch()
+        assert plan == [(Config.LOCATION_ID, hot.date(), hot.date(), False)], plan
+
+
+def test_cache_age_counts_every_fetch():
+    """Narrow fetches also renew the schedule cache age, which survives a restart."""
+    hot = _start_in(Config.BOOKING_WINDOW_HOURS * 3600 - 1800)
+    with _scheduler({'lessons': [_rule(hot)]}, {Config.LOCATION_ID: [_raw_lesson(1, hot)]}) as scheduler:
+        scheduler.refresh_schedule()
+        scheduler._last_fetch -= 3600
+        scheduler.refresh_schedule()  # Only the hot day
+        assert time.time() - scheduler._last_fetch < 60
+        assert time.time() - scheduler._last_full_refresh[Config.LOCATION_ID] < 60
+        scheduler._last_full_refresh[Config.LOCATION_ID] -= 3600
+
+        state = scheduler.export_state()
+        scheduler.restore_state(state)
+        assert scheduler._last_fetch == state['last_fetch']
+        del state['last_fetch']  # State file from before the field existed
+        scheduler.restore_state(state)
+        assert scheduler._last_fetch == scheduler._last_full_refresh[Config.LOCATION_ID]
+
+
+def test_shared_lesson_keeps_owner_rules():
+    """A lesson also listed by another location is judged by its owner's rules when it changes."""
+    start = _start_in(4 * 24 * 3600)
+    rules = {'locations': [
+        {'id': 'A', 'lessons': [_rule(start)]},
+        {'id': 'B', 'lessons': [_rule(start, 'Yoga')]},
+    ]}
+    with _scheduler(rules, {}) as scheduler:
+        scheduler._ingest([_raw_lesson(1, start)], location_id='A')
+        assert [lesson.id for lesson in scheduler.target_lessons()] == ['1']
+        scheduler._ingest([_raw_lesson(1, start, spots_taken=6)], location_id='B')
+        assert [lesson.id for lesson in scheduler.target_lessons()] == ['1']
+        assert scheduler.target_lessons()[0].location_id == 'A'
+
+
+def test_requests_use_configured_location():
+    """Schedule requests and token validation default to the first configured club, not LOCATION_ID."""
+    from api_client import APIClient
+
+    start = _start_in(4 * 24 * 3600)
+    rules = {'locations': [{'id': 'A', 'lessons': [_rule(start)]}, {'id': 'B', 'lessons': [_rule(start)]}]}
+    with _scheduler(rules, {}) as scheduler:
+        assert scheduler.rules.default_location == 'A'
+        scheduler.reload_rules(force=True)
+        assert scheduler.api_client.location_id == 'A'
+
+        client = APIClient()
+        client.location_id = 'A'
+        assert client.auth_client.location_id == 'A'
+
+
+def test_failed_booking_retried_on_timer():
+    """A failed booking of a lesson with free spots is retried on a timer, not on capacity changes."""
+    start = _start_in(Config.BOOKING_WINDOW_HOURS * 3600 - 600)  # In the active window
+    with _scheduler({'lessons': [_rule(start)]}, {Config.LOCATION_ID: [_raw_lesson(1, start)]}) as scheduler:
+        api = scheduler.api_client
+        api.book_result = False
+        lessons = scheduler.get_upcoming_bookable_lessons()
+        assert not scheduler.book_lesson(lessons[0])
+        assert scheduler.full_lesson_retries['1']['full'] is False
+
+        # Not again before the retry interval, then again once it has passed
+        assert scheduler.get_upcoming_bookable_lessons() == []
+        retry_info = scheduler.full_lesson_retries['1']
+        retry_info['last_attempt'] -= timedelta(minutes=Config.RETRY_INTERVAL_MINUTES)
+        api.book_result = True
+        lessons = scheduler.get_upcoming_bookable_lessons()
+        assert [lesson.id for lesson in lessons] == ['1']
+        assert scheduler.book_lesson(lessons[0]) and api.posts == ['1', '1']
+
+
+def test_full_lesson_waits_for_capacity():
+    """A full lesson is only retried once a spot opens up."""
+    start = _start_in(Config.BOOKING_WINDOW_HOURS * 3600 - 600)
+    schedule = [_raw_lesson(1, start, spots_taken=20)]
+    with _scheduler({'lessons': [_rule(start)]}, {Config.LOCATION_ID: schedule}) as scheduler:
+        lessons = scheduler.get_upcoming_bookable_lessons()
+        assert not scheduler.book_lesson(lessons[0])
+        assert scheduler.full_lesson_retries['1']['full'] is True
+        scheduler.full_lesson_retries['1']['last_attempt'] -= timedelta(hours=2)
+        assert scheduler.get_upcoming_bookable_lessons() == []
+
+        schedule[0] = _raw_lesson(1, start, spots_taken=19)
+        assert [lesson.id for lesson in scheduler.get_upcoming_bookable_lessons()] == ['1']
+
+
+if __name__ == "__main__":
+    try:
+        test_no_busy_loop_before_window_opens()
+        test_full_refresh_while_deadlines_are_hot()
+        test_cache_age_counts_every_fetch()
+        test_shared_lesson_keeps_owner_rules()
+        test_requests_use_configured_location()
+        test_failed_booking_retried_on_timer()
+        test_full_lesson_waits_for_capacity()
+        logger.info("All scheduler tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
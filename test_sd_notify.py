@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test script for systemd notifications (no API access needed).
+"""
+import logging
+import os
+import socket
+import sys
+import tempfile
+
+import sd_notify
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def test_notify_socket():
+    """Messages are sent to $NOTIFY_SOCKET, and skipped without it."""
+    old_socket = os.environ.pop('NOTIFY_SOCKET', None)
+    try:
+        assert sd_notify.notify('READY=1') is False
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'notify.sock')
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as server:
+                server.bind(path)
+                os.environ['NOTIFY_SOCKET'] = path
+                assert sd_notify.notify('READY=1') is True
+                assert server.recv(64) == b'READY=1'
+    finally:
+        os.environ.pop('NOTIFY_SOCKET', None)
+        if old_socket is not None:
+            os.environ['NOTIFY_SOCKET'] = old_socket
+
+
+def test_watchdog_interval():
+    """The watchdog is pinged at half of WatchdogSec, only in the watched process."""
+    old = {key: os.environ.pop(key, None) for key in ('WATCHDOG_USEC', 'WATCHDOG_PID')}
+    try:
+        assert sd_notify.watchdog_interval() is None
+        os.environ['WATCHDOG_USEC'] = '600000000'
+        assert sd_notify.watchdog_interval() == 300
+        os.environ['WATCHDOG_PID'] = str(os.getpid() + 1)
+        assert sd_notify.watchdog_interval() is None
+    finally:
+        for key, value in old.items():
+            os.environ.pop(key, None)
+            if value is not None:
+                os.environ[key] = value
+
+
+if __name__ == "__main__":
+    try:
+        test_notify_socket()
+        test_watchdog_interval()
+        logger.info("All systemd notification tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
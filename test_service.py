@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Test script for the asyncio service runtime and API rate limiting (no API access needed).
+"""
+import asyncio
+import json
+import logging
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from api_client import RateLimiter
+from config import Config
+from decision_log import ACTION_WAIT, RULE_WINDOW, DecisionLog
+from profiling import Profiler
+from service import BookingService
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Scheduler:
+    """Scheduler stand-in that records what the service asks it to do."""
+
+    def __init__(self):
+        self.calls = []
+        self.attempted_lesson_ids = set()
+        self.booked_lesson_ids = set()
+        self.full_lesson_retries = {}
+        self.schedule_index = {}
+        self.outbox = []
+        self.decisions = DecisionLog()
+        self.decisions.record('42', RULE_WINDOW, ACTION_WAIT)
+
+    def reload_rules(self, force=False):
+        self.calls.append('reload_rules')
+        return False
+
+    def get_upcoming_bookable_lessons(self):
+        self.calls.append('get_upcoming_bookable_lessons')
+        return []
+
+    def target_lessons(self):
+        return []
+
+    def flush_outbox(self):
+        self.calls.append('flush_outbox')
+
+    def save_state(self):
+        self.calls.append('save_state')
+
+    def next_cycle_delay(self):
+        return 3600
+
+
+class _BookingScheduler(_Scheduler):
+    """Scheduler stand-in with one lesson to book."""
+
+    def get_upcoming_bookable_lessons(self):
+        super().get_upcoming_bookable_lessons()
+        return [SimpleNamespace(id='1', name='Pilates', start_time=datetime.now(), target_ts=time.time())]
+
+    def book_lesson(self, lesson):
+        self.calls.append('book_lesson')
+        self.outbox.append({'lesson': lesson.id})
+        return True
+
+
+class _ReloadingScheduler(_Scheduler):
+    """Scheduler stand-in whose rules always changed, recording overlapping calls."""
+
+    def __init__(self):
+        super().__init__()
+        self.running = 0
+        self.overlaps = 0
+
+    def _work(self, name):
+        self.running += 1
+        if self.running > 1:
+            self.overlaps += 1
+        time.sleep(0.01)
+        self.calls.append(name)
+        self.running -= 1
+
+    def reload_rules(self, force=False):
+        self._work('reload_rules')
+        return True
+
+    def get_upcoming_bookable_lessons(self):
+        self._work('get_upcoming_bookable_lessons')
+        return []
+
+    def next_cycle_delay(self):
+        return 0.01
+
+
+class _SlowScheduler(_Scheduler):
+    """Scheduler stand-in whose cycle takes a while."""
+
+    def get_upcoming_bookable_lessons(self):
+        time.sleep(1)
+        self.calls.append('get_upcoming_bookable_lessons')
+        return []
+
+
+def test_rate_limiter():
+    """The limiter lets a burst through, then paces calls at the configured rate."""
+    limiter = RateLimiter(rate=20, burst=2)
+    start = time.monotonic()
+    waits = [limiter.acquire() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert time.monotonic() - start >= 0.09
+    assert RateLimiter(rate=0).acquire() == 0.0
+
+
+def test_service_status_and_stop():
+    """A cycle runs, the status endpoint answers, and a stop request flushes state and exits."""
+    scheduler = _Scheduler()
+    service = BookingService(scheduler)
+    Config.STATUS_PORT, old_port = 0, Config.STATUS_PORT
+
+    async def scenario():
+        task = asyncio.create_task(service._main())
+        await asyncio.sleep(0.2)
+
+        server = await asyncio.start_server(service._handle_status, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /status HTTP/1.0\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /decisions?lesson=42&limit=5 HTTP/1.0\r\n\r\n')
+        decisions = await reader.read()
+        writer.close()
+        server.close()
+
+        service.request_stop()
+        await asyncio.wait_for(task, timeout=5)
+        return response, decisions
+
+    try:
+        response, decisions = asyncio.run(scenario())
+    finally:
+        Config.STATUS_PORT = old_port
+
+    head, body = response.split(b'\r\n\r\n', 1)
+    assert head.startswith(b'HTTP/1.0 200')
+    status = json.loads(body)
+    assert status['last_cycle']['checked'] == 0
+    assert status['next_cycle_in_seconds'] > 3000
+    assert status['decisions_recorded'] == 1
+
+    head, body = decisions.split(b'\r\n\r\n', 1)
+    assert head.startswith(b'HTTP/1.0 200')
+    records = json.loads(body)['decisions']
+    assert [(r['lesson'], r['rule'], r['action']) for r in records] == [('42', 'window', 'wait')]
+    assert scheduler.calls[:2] == ['reload_rules', 'get_upcoming_bookable_lessons']
+    assert scheduler.calls[-2:] == ['flush_outbox', 'save_state']
+
+
+def test_profiled_cycle_covers_bookings():
+    """A profiled cycle includes the booking requests, not only the schedule refresh."""
+    scheduler = _BookingScheduler()
+    service = BookingService(scheduler)
+
+    async def scenario():
+        service._stop = asyncio.Event()
+        service._wake = asyncio.Event()
+        service._outbox_ready = asyncio.Event()
+        service._cycle_lock = asyncio.Lock()
+        await service._run_cycle()
+        return service._outbox_ready.is_set()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service.profiler = Profiler(tmp)
+        service.profiler.request_cycles(1)
+        assert asyncio.run(scenario())
+        assert service.last_cycle['booked'] == 1
+
+        prof = [name for name in os.listdir(tmp) if name.endswith('.prof')]
+        assert len(prof) == 1
+        functions = {function for _, _, function in pstats.Stats(os.path.join(tmp, prof[0])).stats}
+        assert {'get_upcoming_bookable_lessons', 'book_lesson'} <= functions
+
+
+def test_rules_reload_waits_for_cycle():
+    """The rules watcher never reloads the rules while a cycle is using them."""
+    scheduler = _ReloadingScheduler()
+    service = BookingService(scheduler)
+    old = Config.STATUS_PORT, Config.RULES_POLL_SECONDS
+    Config.STATUS_PORT, Config.RULES_POLL_SECONDS = 0, 0.005
+
+    async def scenario():
+        task = asyncio.create_task(service._main())
+        await asyncio.sleep(0.5)
+        service.request_stop()
+        await asyncio.wait_for(task, timeout=5)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        Config.STATUS_PORT, Config.RULES_POLL_SECONDS = old
+    assert scheduler.calls.count('get_upcoming_bookable_lessons') > 2
+    assert scheduler.overlaps == 0
+
+
+def test_status_reads_snapshot():
+    """status() never reads the structures the cycle thread is changing."""
+    scheduler = _Scheduler()
+    scheduler.full_lesson_retries = {'1': {'full': True}, '2': {'full': False}}
+    service = BookingService(scheduler)
+    service._snapshot_status()
+
+    def busy():
+        raise AssertionError("status() read the live scheduler")
+
+    scheduler.target_lessons = busy
+    scheduler.full_lesson_retries = None
+    status = service.status()
+    assert status['waiting_for_spot'] == 1 and status['retrying_after_error'] == 1
+    assert status['targets'] == 0 and status['next_window'] is None
+
+
+def test_cancel_waits_for_cycle_before_saving():
+    """State is only saved once the cycle thread has finished, even when the cycle is cancelled."""
+    scheduler = _SlowScheduler()
+    service = BookingService(scheduler)
+    Config.STATUS_PORT, old_port = 0, Config.STATUS_PORT
+
+    async def scenario():
+        task = asyncio.create_task(service._main())
+        await asyncio.sleep(0.3)
+        task.cancel()
+        await asyncio.wait_for(task, timeout=5)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        Config.STATUS_PORT = old_port
+    assert scheduler.calls.index('get_upcoming_bookable_lessons') < scheduler.calls.index('save_state')
+    assert scheduler.calls[-1] == 'save_state'
+
+
+def test_second_stop_exits_at_once():
+    """A second SIGTERM during a long cycle ends the process right away, without saving state."""
+    script = (
+        "import os, signal, threading, time\n"
+        "from config import Config\n"
+        "from service import BookingService\n"
+        "from test_service import _SlowScheduler\n"
+        "Config.STATUS_PORT = 0\n"
+        "scheduler = _SlowScheduler()\n"
+        "scheduler.get_upcoming_bookable_lessons = lambda: time.sleep(8) or []\n"
+        "def stop():\n"
+        "    time.sleep(0.5)\n"
+        "    os.kill(os.getpid(), signal.SIGTERM)\n"
+        "    time.sleep(0.5)\n"
+        "    os.kill(os.getpid(), signal.SIGTERM)\n"
+        "threading.Thread(target=stop, daemon=True).start()\n"
+        "try:\n"
+        "    BookingService(scheduler).run()\n"
+        "finally:\n"
+        "    print(scheduler.calls)\n"
+    )
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=20,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert time.monotonic() - start < 5
+    assert result.returncode == 1, result.stderr
+    assert 'save_state' not in result.stdout
+
+
+if __name__ == "__main__":
+    try:
+        test_rate_limiter()
+        test_service_status_and_stop()
+        test_profiled_cycle_covers_bookings()
+        test_rules_reload_waits_for_cycle()
+        test_status_reads_snapshot()
+        test_cancel_waits_for_cycle_before_saving()
+        test_second_stop_exits_at_once()
+        logger.info("All service tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
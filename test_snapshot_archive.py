@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for the schedule snapshot archive and fill-rate report (no API access needed).
+"""
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from lesson import LOCAL_TZ
+from snapshot_archive import KIND_CATALOG, KIND_SNAPSHOT, SnapshotArchive, fill_report
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+LESSON_START = datetime(2025, 11, 7, 10, 30, tzinfo=LOCAL_TZ)
+
+
+def _schedule(yoga_spots: int) -> list:
+    return [
+        {'_id': '1', 'Description': 'Yoga', 'LessonStartTime': LESSON_START.isoformat(),
+         'SpotsInt': yoga_spots, 'MaximumParticipants': 10, 'Full': yoga_spots >= 10},
+        {'_id': '2', 'Description': 'Pilates', 'LessonStartTime': LESSON_START.isoformat(),
+         'SpotsInt': 1, 'MaximumParticipants': 10, 'Full': False},
+    ]
+
+
+def test_archive_roundtrip():
+    """Snapshots are stored column-wise and lesson details only once."""
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SnapshotArchive(os.path.join(tmp, 'archive.bin'))
+        start = LESSON_START.timestamp()
+        archive.append(_schedule(5), start - 50 * 3600)
+        archive.append(_schedule(10), start - 47.5 * 3600)
+
+        frames = list(SnapshotArchive(archive.path).frames())
+        assert [kind for kind, _, _ in frames] == [KIND_CATALOG, KIND_SNAPSHOT, KIND_SNAPSHOT]
+        assert frames[0][2]['type'] == ['Yoga', 'Pilates']
+        assert list(frames[2][2]['spots']) == [10, 1]
+        assert bytes(frames[2][2]['full']) == b'\x01\x00'
+
+        # A half-written frame at the end is ignored
+        with open(archive.path, 'ab') as f:
+            f.write(b'SA\x01partial')
+        assert len(list(SnapshotArchive(archive.path).frames())) == 3
+
+
+def test_fill_report():
+    """The report shows fill ratio per bucket and when lessons filled up."""
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SnapshotArchive(os.path.join(tmp, 'archive.bin'))
+        start = LESSON_START.timestamp()
+        archive.append(_schedule(5), start - 50 * 3600)
+        archive.append(_schedule(10), start - 47.5 * 3600)
+
+        report = fill_report(archive)
+        assert report['Yoga']['filled'] == 1
+        assert report['Yoga']['first_full_hours'] == [47.5]
+        assert report['Yoga']['curve'][48] == (0.5, 0.0, 1)
+        assert report['Yoga']['curve'][47] == (1.0, 1.0, 1)
+        assert report['Pilates']['filled'] == 0
+
+        assert set(fill_report(archive, {'Pilates'})) == {'Pilates'}
+
+
+def test_torn_frame_recovery():
+    """A frame torn by a crash neither breaks reading nor the frames appended after it."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'archive.bin')
+        start = LESSON_START.timestamp()
+        SnapshotArchive(path).append(_schedule(5), start - 50 * 3600)
+        size = os.path.getsize(path)
+        SnapshotArchive(path).append(_schedule(8), start - 49 * 3600)
+        with open(path, 'r+b') as f:
+            f.truncate(size + 20)  # Crash in the middle of the second snapshot
+
+        # Written the way an older version did: straight after the torn frame
+        torn = SnapshotArchive(os.path.join(tmp, 'torn.bin'))
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(torn.path, 'wb') as f:
+            f.write(data + SnapshotArchive._frame(KIND_SNAPSHOT, start - 47.5 * 3600, 0, b'\0' * 4))
+        assert [kind for kind, _, _ in torn.frames()] == [KIND_CATALOG, KIND_SNAPSHOT, KIND_SNAPSHOT]
+
+        # The next run cuts the torn frame off before appending
+        archive = SnapshotArchive(path)
+        archive.append(_schedule(10), start - 47.5 * 3600)
+        assert os.path.getsize(path) > size
+        frames = list(SnapshotArchive(path).frames())
+        assert [kind for kind, _, _ in frames] == [KIND_CATALOG, KIND_SNAPSHOT, KIND_SNAPSHOT]
+        assert list(frames[2][2]['spots']) == [10, 1]
+        assert fill_report(SnapshotArchive(path))['Yoga']['filled'] == 1
+
+        # Also when the frame is torn inside its header
+        with open(path, 'ab') as f:
+            f.write(b'SA\x01')
+        SnapshotArchive(path).append(_schedule(10), start - 46 * 3600)
+        assert len(list(SnapshotArchive(path).frames())) == 4
+
+
+if __name__ == "__main__":
+    try:
+        test_archive_roundtrip()
+        test_fill_report()
+        test_torn_frame_recovery()
+        logger.info("All snapshot archive tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script for the persisted scheduler state (no API access needed).
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from state_store import STATE_VERSION, StateStore
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def test_state_roundtrip():
+    """Saved state is loaded back with version and save time."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StateStore(os.path.join(tmp, 'state.json'))
+        assert store.load() == {}
+
+        store.save({'booked_lesson_ids': ['1'], 'schedule': [['13686', {'_id': '1'}]]})
+        state = store.load()
+        assert state['version'] == STATE_VERSION
+        assert state['booked_lesson_ids'] == ['1']
+        assert state['schedule'] == [['13686', {'_id': '1'}]]
+        assert os.listdir(tmp) == ['state.json']
+
+
+def test_state_ignores_invalid_files():
+    """Corrupt files and files from another version are ignored."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'state.json')
+        store = StateStore(path)
+
+        with open(path, 'w') as f:
+            f.write('{"version": 1, "booked')
+        assert store.load() == {}
+
+        with open(path, 'w') as f:
+            json.dump({'version': STATE_VERSION + 1, 'booked_lesson_ids': ['1']}, f)
+        assert store.load() == {}
+
+
+if __name__ == "__main__":
+    try:
+        test_state_roundtrip()
+        test_state_ignores_invalid_files()
+        logger.info("All state store tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for token storage and revalidation (no API access needed).
+"""
+import logging
+import os
+import sys
+import tempfile
+
+from auth import AuthClient, TokenManager
+
+# Setup logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def test_token_storage():
+    """The key is read once, tokens survive a restart, and invalidation keeps the file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        token_file = os.path.join(tmp, 'token.enc')
+        key_file = os.path.join(tmp, '.token_key')
+
+        first = TokenManager(token_file, key_file)
+        assert first.get_token() is None
+        first.save_token('abc')
+        assert oct(os.stat(key_file).st_mode & 0o777) == '0o600'
+
+        second = TokenManager(token_file, key_file)
+        assert second._cipher is first._cipher
+        assert second.get_token() == 'abc'
+
+        # A rejected token is not reloaded, but a newer one saved by another process is
+        second.invalidate()
+        assert os.path.exists(token_file)
+        assert second.get_token() is None
+        first.save_token('def')
+        assert second.get_token() == 'def'
+
+        first.clear_token()
+        assert not os.path.exists(token_file)
+
+
+class _CountingAuthClient(AuthClient):
+    """AuthClient whose API checks are counted instead of sent."""
+
+    def __init__(self, token_manager):
+        self.token_manager = token_manager
+        self._validated_at = None
+        self.validations = 0
+
+    def validate_token(self) -> bool:
+        self.validations += 1
+        return True
+
+
+def test_token_revalidation():
+    """A stored token is checked with the API once, not before every request."""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = TokenManager(os.path.join(tmp, 'token.enc'), os.path.join(tmp, '.token_key'))
+        manager.save_token('abc')
+        client = _CountingAuthClient(manager)
+
+        assert [client.ensure_authenticated() for _ in range(3)] == ['abc'] * 3
+        assert client.validations == 1
+
+        client.invalidate()
+        manager.save_token('def')  # e.g. written by another process
+        assert client.ensure_authenticated() == 'def'
+        assert client.validations == 2
+
+
+if __name__ == "__main__":
+    try:
+        test_token_storage()
+        test_token_revalidation()
+        logger.info("All token manager tests passed")
+        sys.exit(0)
+    except Exception as e:
+        logger.error(f"Test failed: {e}", exc_info=True)
+        sys.exit(1)